@@ -0,0 +1,51 @@
+"""
+The core of the pose correction GUI: reading and editing the tracked points, finding bad tracking, fixing swapped
+labels and filling in frames, and reading the video. None of it needs a display, so it can be used from scripts and
+worker processes:
+
+    from posecorrection import find_bad_tracking, PoseStore
+
+The names below are only imported when they are first used, so importing the package does not load cv2, pandas or
+PyQt5
+"""
+import importlib
+
+_core = {
+    'PoseStore': 'poseStore',
+    'read_coordinates': 'poseStore',
+    'iter_coordinates': 'poseStore',
+    'EditHistory': 'editHistory',
+    'set_tracking_rules': 'trackingRules',
+    'score_tracking': 'trackingRules',
+    'flag_frames': 'trackingRules',
+    'merge_segments': 'trackingRules',
+    'find_bad_tracking': 'findBadTracking',
+    'find_bad_tracking_chunked': 'findBadTracking',
+    'bad_tracking_file': 'findBadTracking',
+    'BadFrameIndex': 'badFrameIndex',
+    'propose_swaps': 'identityTracking',
+    'swap_labels': 'swapLabels',
+    'swap_label_sequences': 'swapLabels',
+    'resolve_swaps': 'swapLabels',
+    'propagate_frame': 'propagateFrame',
+    'interpolate_frames': 'propagateFrame',
+    'track_forward': 'keypointFlow',
+    'FrameProvider': 'frameProvider',
+    'FrameStore': 'frameStore',
+    'make_proxy': 'proxyVideo',
+    'find_proxy': 'proxyVideo',
+}
+
+__all__ = list(_core)
+
+
+def __getattr__(name):
+    if name not in _core:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{_core[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
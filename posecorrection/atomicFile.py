@@ -0,0 +1,52 @@
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def sync_file(file):
+    """
+    Make sure what was written to a file is on the disk and not only in the cache of the operating system
+    :param file: the filepath for the file
+    :return:
+    """
+    with open(file, 'rb+') as fw:
+        os.fsync(fw.fileno())
+
+
+def replace_file(tmp_file, file):
+    """
+    Move a finished temporary file over a file in one step. The temporary file is synced to disk first, so after a
+    crash the file holds either its old or its new contents, never a mix
+    :param tmp_file: the filepath for the finished temporary file, in the same folder as the file
+    :param file: the filepath for the file to replace
+    :return:
+    """
+    sync_file(tmp_file)
+    os.replace(tmp_file, file)
+
+    # Also sync the folder, so the rename itself survives a crash. Folders cannot be opened on Windows
+    if hasattr(os, 'O_DIRECTORY'):
+        folder = os.open(Path(file).resolve().parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(folder)
+        finally:
+            os.close(folder)
+
+
+@contextmanager
+def atomic_write(file, mode='wb'):
+    """
+    Write a file through a temporary file that replaces it once the writing is done. If the writing fails, the file is
+    left as it was
+    :param file: the filepath for the file to write
+    :param mode: the mode to open the temporary file in, 'wb' or 'w'
+    :return: the open temporary file
+    """
+    tmp_file = f'{file}.tmp'
+    try:
+        with open(tmp_file, mode) as fw:
+            yield fw
+        replace_file(tmp_file, file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
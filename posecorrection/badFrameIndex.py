@@ -0,0 +1,135 @@
+import numpy as np
+
+from .findBadTracking import bad_tracking_file
+from .trackingRules import RULE_NAMES, BAD_FRAME_DTYPE, merge_segments
+
+
+class BadFrameIndex:
+    """
+    Sorted, deduplicated index of the bad tracking frames of an H5 file, with the rules each frame breaks and the
+    individuals that break them. Bad frames that are close together are merged into segments. Loaded once and searched
+    with binary search to move to the next or previous bad frame or segment
+    """
+
+    def __init__(self, bad_frames, gap=0):
+        """
+        :param bad_frames: array with the BAD_FRAME_DTYPE fields, or plain frame numbers from older bad tracking files
+        :param gap: the largest number of good frames between two bad frames of the same segment
+        """
+        bad_frames = np.asarray(bad_frames)
+        if bad_frames.dtype.names is None:
+            details = np.zeros(len(bad_frames), dtype=BAD_FRAME_DTYPE)
+            details['frame'] = bad_frames
+            bad_frames = details
+
+        # Merge the entries of frames that are listed more than once
+        self.frames, inverse = np.unique(bad_frames['frame'], return_inverse=True)
+        self.reasons = np.zeros(len(self.frames), dtype=np.uint8)
+        self.individuals = np.zeros(len(self.frames), dtype=np.uint64)
+        np.bitwise_or.at(self.reasons, inverse, bad_frames['reasons'])
+        np.bitwise_or.at(self.individuals, inverse, bad_frames['individuals'])
+
+        details = np.zeros(len(self.frames), dtype=BAD_FRAME_DTYPE)
+        details['frame'] = self.frames
+        details['reasons'] = self.reasons
+        details['individuals'] = self.individuals
+        self.segments = merge_segments(details, gap)
+
+    @classmethod
+    def load(cls, h5_path, gap=0):
+        """
+        Load the bad tracking frames saved for an H5 file
+        :param h5_path: the filepath for the H5 file
+        :param gap: the largest number of good frames between two bad frames of the same segment
+        :return: the BadFrameIndex
+        """
+        return cls(np.load(bad_tracking_file(h5_path)), gap)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def next(self, frame_number):
+        """
+        Find the first bad frame after a frame
+        :param frame_number: the current frame number
+        :return: the position of the bad frame in the index or None if there are no more bad frames
+        """
+        position = int(np.searchsorted(self.frames, frame_number, side='right'))
+        return position if position < len(self.frames) else None
+
+    def previous(self, frame_number):
+        """
+        Find the last bad frame before a frame
+        :param frame_number: the current frame number
+        :return: the position of the bad frame in the index or None if there are no earlier bad frames
+        """
+        position = int(np.searchsorted(self.frames, frame_number, side='left')) - 1
+        return position if position >= 0 else None
+
+    def next_segment(self, frame_number):
+        """
+        Find the first segment that starts after a frame
+        :param frame_number: the current frame number
+        :return: the position of the segment or None if there are no more segments
+        """
+        position = int(np.searchsorted(self.segments['start'], frame_number, side='right'))
+        return position if position < len(self.segments) else None
+
+    def previous_segment(self, frame_number):
+        """
+        Find the last segment that starts before a frame
+        :param frame_number: the current frame number
+        :return: the position of the segment or None if there are no earlier segments
+        """
+        position = int(np.searchsorted(self.segments['start'], frame_number, side='left')) - 1
+        return position if position >= 0 else None
+
+    def segment_progress(self, position):
+        """
+        How far through the segments a position is
+        :param position: the position of the segment
+        :return: the percentage of segments before the position
+        """
+        return np.round((position / len(self.segments)) * 100)
+
+    def progress(self, position):
+        """
+        How far through the bad frames a position is
+        :param position: the position in the index
+        :return: the percentage of bad frames before the position
+        """
+        return np.round((position / len(self.frames)) * 100)
+
+    def reason_names(self, position):
+        """
+        Get the rules a bad frame breaks
+        :param position: the position in the index
+        :return: list of rule names
+        """
+        return [name for k, name in enumerate(RULE_NAMES) if self.reasons[position] & (1 << k)]
+
+    def individual_indices(self, position):
+        """
+        Get the individuals that break the rules in a bad frame
+        :param position: the position in the index
+        :return: list of individual indices
+        """
+        individuals = int(self.individuals[position])
+        return [k for k in range(individuals.bit_length()) if individuals & (1 << k)]
+
+    def segment_reason_names(self, position):
+        """
+        Get the rules broken in a segment
+        :param position: the position of the segment
+        :return: list of rule names
+        """
+        return [name for k, name in enumerate(RULE_NAMES) if self.segments['reasons'][position] & (1 << k)]
+
+    def segment_individual_indices(self, position):
+        """
+        Get the individuals that break the rules in a segment
+        :param position: the position of the segment
+        :return: list of individual indices
+        """
+        individuals = int(self.segments['individuals'][position])
+        return [k for k in range(individuals.bit_length()) if individuals & (1 << k)]
@@ -0,0 +1,99 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import yaml
+
+from .findBadTracking import find_bad_tracking, find_bad_tracking_chunked
+from .trackingRules import set_tracking_rules, flag_frames
+
+DEFAULT_CONFIG = str(Path(__file__).resolve().parent / 'config.yaml')
+
+
+def collect_h5_files(paths, recursive=False):
+    """
+    Find the H5 files to process
+    :param paths: directories, H5 files or glob patterns
+    :param recursive: also look in the subdirectories of the directories
+    :return: sorted list of H5 filepaths
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            pattern = '**/*.h5' if recursive else '*.h5'
+            files.update(str(file) for file in Path(path).glob(pattern))
+        else:
+            files.update(file for file in glob.glob(path, recursive=recursive) if file.endswith('.h5'))
+    return sorted(files)
+
+
+def process_file(file, rules=None, chunksize=None):
+    """
+    Find the bad tracking frames of one H5 file
+    :param file: the filepath for the H5 file
+    :param rules: the settings of the rules. Defaults to the default rules
+    :param chunksize: read the file this many frames at a time. Reads the whole file at once if None
+    :return: the number of frames, the number of bad frames and the time it took in seconds
+    """
+    start_time = time.perf_counter()
+    if chunksize:
+        n_frames = None
+        n_flagged = find_bad_tracking_chunked(file, rules, chunksize)
+    else:
+        scores = find_bad_tracking(file, rules)
+        n_frames = len(next(iter(scores.values()))) if scores else 0
+        n_flagged = len(flag_frames(scores, rules))
+    return n_frames, n_flagged, time.perf_counter() - start_time
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Find bad tracking in many H5 files without the GUI')
+    parser.add_argument('paths', nargs='+', help='directories, H5 files or glob patterns')
+    parser.add_argument('-r', '--recursive', action='store_true', help='look in subdirectories too')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='number of processes to use')
+    parser.add_argument('-c', '--config', default=None,
+                        help='config file with an optional bad_tracking section. Defaults to the config.yaml of the '
+                             'GUI, if there is one')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='read each file this many frames at a time, for files too big to load at once. Files '
+                             "saved in the fixed format are still read at once, save them with format='table'")
+    args = parser.parse_args(args)
+
+    rules = None
+    config_file = args.config or DEFAULT_CONFIG
+    if args.config is not None and not os.path.exists(args.config):
+        parser.error(f'config file {args.config} does not exist')
+    if os.path.exists(config_file):
+        with open(config_file, 'r') as fr:
+            config = yaml.load(fr, Loader=yaml.FullLoader) or {}
+        rules = config.get('bad_tracking')
+    rules = dict(set_tracking_rules(rules))
+
+    files = collect_h5_files(args.paths, args.recursive)
+    if not files:
+        print('No H5 files found')
+        return 1
+
+    n_failed = 0
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(process_file, file, rules, args.chunksize): file for file in files}
+        for future in as_completed(futures):
+            file = futures[future]
+            try:
+                n_frames, n_flagged, elapsed = future.result()
+            except Exception as error:
+                n_failed += 1
+                print(f'{file}: failed - {error}')
+                continue
+            frames = f' of {n_frames}' if n_frames is not None else ''
+            print(f'{file}: {n_flagged}{frames} frames flagged in {elapsed:.2f} s')
+
+    print(f'Processed {len(files) - n_failed} of {len(files)} files in {time.perf_counter() - start_time:.2f} s')
+    return 1 if n_failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,74 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# The benchmark does not need a display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication
+
+from .processFrame import process_frame
+from .qImageProcess import qt_image_process, FrameConverter, FORMAT_BGR888
+
+
+def time_per_frame(convert, frames, repeats):
+    """
+    Time a conversion over a set of frames
+    :param convert: called with each frame
+    :param frames: the frames
+    :param repeats: the number of times to go over the frames
+    :return: the median time per frame in milliseconds
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for image in frames:
+            convert(image)
+        times.append((time.perf_counter() - start) / len(frames))
+    return float(np.median(times)) * 1000
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Time the conversion of video frames to the QPixmap shown in the GUI')
+    parser.add_argument('--width', type=int, default=1920, help='the width of the frames in the video')
+    parser.add_argument('--height', type=int, default=1080, help='the height of the frames in the video')
+    parser.add_argument('--screen', type=int, nargs=2, default=(1080, 1920), metavar=('HEIGHT', 'WIDTH'),
+                        help='the size of the screen, which decides whether the frames are halved')
+    parser.add_argument('--frames', type=int, default=20, help='the number of different frames to convert')
+    parser.add_argument('--repeats', type=int, default=5, help='the number of times to time the frames')
+    args = parser.parse_args(args)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, size=(args.frames, args.height, args.width, 3), dtype=np.uint8)
+    screen_height, screen_width = args.screen
+    dim = process_frame(frames[0], screen_height, screen_width).shape[1::-1]
+
+    def before(image):
+        return qt_image_process(process_frame(image, screen_height, screen_width))
+
+    results = [('qt_image_process (before)', time_per_frame(before, frames, args.repeats))]
+    converters = [('FrameConverter RGB buffer', FrameConverter(bgr=False))]
+    if FORMAT_BGR888 is not None:
+        converters.append(('FrameConverter BGR888', FrameConverter(bgr=True)))
+    for name, converter in converters:
+        results.append((name, time_per_frame(lambda image: converter.to_pixmap(
+            process_frame(image, screen_height, screen_width, dim)), frames, args.repeats)))
+
+    # Frames from the frame store are already resized, so only the conversion is left
+    resized = np.array([process_frame(image, screen_height, screen_width) for image in frames])
+    results.append(('qt_image_process, resized frames', time_per_frame(qt_image_process, resized, args.repeats)))
+    for name, converter in converters:
+        results.append((f'{name}, resized frames', time_per_frame(converter.to_pixmap, resized, args.repeats)))
+
+    # The Qt platform is printed too, as the conversion to a QPixmap depends on it
+    print(f'{args.width}x{args.height} frames shown at {dim[0]}x{dim[1]} on the {app.platformName()} platform')
+    for name, milliseconds in results:
+        print(f'{name:<45} {milliseconds:8.3f} ms per frame')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,312 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from .poseStore import PoseStore
+from .findBadTracking import find_bad_tracking, find_bad_tracking_chunked
+from .swapLabels import swap_label_sequences
+from .propagateFrame import propagate_frame
+from .updateH5file import update_h5file
+from .plotTrackedPoints import plot_tracked_points
+
+# The body points the default bad tracking rules use, followed by a few more
+BODYPARTS = ['Nose', 'betweenEars', 'leftMidWaist', 'rightMidWaist', 'midHip', 'tailStart', 'leftEar', 'rightEar',
+             'tailMid', 'tailEnd']
+
+# Where each body point sits on an animal facing right, relative to its center, in body lengths
+BODY_LAYOUT = np.array([[0.5, 0], [0.3, 0], [0, 0.15], [0, -0.15], [-0.2, 0], [-0.35, 0], [0.3, 0.1], [0.3, -0.1],
+                        [-0.6, 0], [-0.85, 0]])
+
+
+def synthetic_coordinates(n_frames, n_animals=2, n_bodyparts=6, width=640, height=480, body_length=80, swap_rate=0.001,
+                          missing_rate=0.01, seed=0):
+    """
+    Make tracked points of animals walking around an arena, with the tracking errors of real data: label swaps
+    between the animals, jittered points and missing points
+    :param n_frames: the number of frames
+    :param n_animals: the number of animals
+    :param n_bodyparts: the number of body points on each animal, at most len(BODYPARTS)
+    :param width: the width of the arena in pixels
+    :param height: the height of the arena in pixels
+    :param body_length: the length of the animals in pixels
+    :param swap_rate: the chance per frame that a run of swapped labels starts
+    :param missing_rate: the fraction of body points that are missing
+    :param seed: the seed of the random numbers
+    :return: the coordinates with shape (frames, individuals, bodyparts, 2) and the names of the body points
+    """
+    rng = np.random.default_rng(seed)
+    layout = BODY_LAYOUT[:n_bodyparts] * body_length
+
+    # Each animal wanders with a smoothly turning heading and bounces off the walls
+    heading = np.cumsum(rng.normal(0, 0.1, size=(n_frames, n_animals)), axis=0) + rng.uniform(0, 2 * np.pi, n_animals)
+    steps = np.stack([np.cos(heading), np.sin(heading)], axis=-1) * rng.uniform(0.5, 3, size=(n_frames, n_animals, 1))
+    size = np.array([width, height], dtype=float)
+    centers = np.abs(np.cumsum(steps, axis=0) + rng.uniform(0, 1, size=(n_animals, 2)) * size) % (2 * size)
+    centers = np.where(centers > size, 2 * size - centers, centers)
+
+    cos, sin = np.cos(heading)[..., None], np.sin(heading)[..., None]
+    coords = np.stack([centers[:, :, None, 0] + cos * layout[:, 0] - sin * layout[:, 1],
+                       centers[:, :, None, 1] + sin * layout[:, 0] + cos * layout[:, 1]], axis=-1)
+    coords += rng.normal(0, 1, size=coords.shape)
+
+    if n_animals > 1:
+        for start in np.flatnonzero(rng.random(n_frames) < swap_rate):
+            stop = start + rng.integers(1, 50)
+            coords[start:stop] = coords[start:stop, ::-1].copy()
+    coords[rng.random(coords.shape[:3]) < missing_rate] = np.nan
+
+    return coords, BODYPARTS[:n_bodyparts]
+
+
+def make_pose_file(h5_filename, n_frames, n_animals=2, n_bodyparts=6, h5_format='table', likelihood=True, seed=0):
+    """
+    Write synthetic tracked points to an H5 file laid out like the files of DeepLabCut and of SLEAP's DeepLabCut export
+    :param h5_filename: the filepath for the H5 file
+    :param n_frames: the number of frames
+    :param n_animals: the number of animals
+    :param n_bodyparts: the number of body points on each animal
+    :param h5_format: the pandas format to save in, table or fixed
+    :param likelihood: add a likelihood column for each body point, as DeepLabCut does
+    :param seed: the seed of the random numbers
+    :return: the coordinates with shape (frames, individuals, bodyparts, 2)
+    """
+    import pandas as pd
+
+    coords, bodyparts = synthetic_coordinates(n_frames, n_animals, n_bodyparts, seed=seed)
+    individuals = [f'animal{i + 1}' for i in range(n_animals)]
+    values = coords
+    coord_names = ['x', 'y']
+    if likelihood:
+        scores = np.where(np.isnan(coords[..., :1]), np.nan, 0.9)
+        values = np.concatenate([coords, scores], axis=-1)
+        coord_names.append('likelihood')
+
+    columns = pd.MultiIndex.from_product([['benchmark'], individuals, bodyparts, coord_names],
+                                         names=['scorer', 'individuals', 'bodyparts', 'coords'])
+    dataframe = pd.DataFrame(values.reshape(n_frames, -1), columns=columns)
+    dataframe.to_hdf(h5_filename, key='df_with_missing', format=h5_format)
+    return coords
+
+
+def make_video(video_name, coords, width=640, height=480, fps=30):
+    """
+    Write a video of the tracked points, so the frames have something to decode
+    :param video_name: the filepath for the video, ending in .mp4 or .avi
+    :param coords: the coordinates with shape (frames, individuals, bodyparts, 2)
+    :param width: the width of the frames
+    :param height: the height of the frames
+    :param fps: the frames per second
+    :return:
+    """
+    import cv2
+
+    fourcc = cv2.VideoWriter_fourcc(*('mp4v' if video_name.endswith('.mp4') else 'MJPG'))
+    writer = cv2.VideoWriter(video_name, fourcc, fps, (width, height))
+    colors = [(0, 0, 255), (0, 255, 0), (255, 0, 0), (0, 255, 255), (255, 0, 255), (255, 255, 0)]
+    background = np.random.default_rng(0).integers(60, 100, size=(height, width, 3), dtype=np.uint8)
+    try:
+        for points in coords:
+            image = background.copy()
+            for animal, animal_points in enumerate(points):
+                for x, y in animal_points[~np.isnan(animal_points).any(axis=1)]:
+                    cv2.circle(image, (int(x), int(y)), 6, colors[animal % len(colors)], -1)
+            writer.write(image)
+    finally:
+        writer.release()
+
+
+def measure(function, repeats=3, setup=None):
+    """
+    Time a function and the memory it allocates at its peak. The timing runs go first, without tracing the memory,
+    because tracing slows Python code down
+    :param function: called with the result of setup
+    :param repeats: the number of timing runs
+    :param setup: called before each run and not timed
+    :return: dictionary with the median and minimum seconds per run and the peak memory in MB
+    """
+    times = []
+    for _ in range(repeats):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        function(state)
+        times.append(time.perf_counter() - start)
+
+    state = setup() if setup is not None else None
+    tracemalloc.start()
+    try:
+        function(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'median_s': float(np.median(times)), 'min_s': float(np.min(times)), 'peak_mb': peak / 2 ** 20}
+
+
+def pose_benchmarks(h5_filename, n_frames, h5_format):
+    """
+    The operations on the tracked points
+    :param h5_filename: the filepath for the synthetic H5 file
+    :param n_frames: the number of frames in the file
+    :param h5_format: the pandas format of the file
+    :return: list of (name, function, setup, calls per run)
+    """
+    rng = np.random.default_rng(1)
+    frames = rng.integers(0, n_frames, size=1000)
+    span = max(n_frames // 10, 1)
+
+    # The file as it was made, copied back before each run that edits it
+    pristine_file = f'{h5_filename}.pristine'
+    shutil.copyfile(h5_filename, pristine_file)
+
+    def pose_store():
+        # Start each run from the file as it was made, without earlier edits or undo history
+        shutil.copyfile(pristine_file, h5_filename)
+        for suffix in ('.journal', '.history', '.history.pos'):
+            if os.path.exists(h5_filename + suffix):
+                os.remove(h5_filename + suffix)
+        return PoseStore(h5_filename)
+
+    def edited_store():
+        store = pose_store()
+        swap_label_sequences(store, 0, span)
+        return store
+
+    def swap_and_flush(store):
+        swap_label_sequences(store, 0, span)
+        store.flush()
+
+    benchmarks = [
+        ('load_pose_store', lambda _: PoseStore(h5_filename), None, 1),
+        ('find_bad_tracking', lambda _: find_bad_tracking(h5_filename), None, 1),
+        ('swap_label_sequences', lambda store: swap_label_sequences(store, 0, span), pose_store, 1),
+        ('propagate_frame', lambda store: propagate_frame(store, n_frames // 2, steps=min(100, n_frames // 2)),
+         pose_store, 1),
+        ('update_h5file', lambda store: [update_h5file(store.coords[frame] * 0.5, store, frame, 0.5)
+                                         for frame in frames[:100]], pose_store, 100),
+        ('flush', lambda store: store.flush(), edited_store, 1),
+        ('plot_tracked_points', lambda store: [plot_tracked_points(store, 0.5, frame) for frame in frames],
+         pose_store, len(frames)),
+    ]
+    if h5_format == 'table':
+        benchmarks.insert(2, ('find_bad_tracking_chunked',
+                              lambda _: find_bad_tracking_chunked(h5_filename, chunksize=max(n_frames // 4, 1)),
+                              None, 1))
+    # An edit written straight to the file, as when saving in the GUI
+    benchmarks.append(('swap_and_flush', swap_and_flush, edited_store, 1))
+    return benchmarks
+
+
+def video_benchmarks(video_name, n_frames):
+    """
+    Navigating the frames of the video, as the GUI does
+    :param video_name: the filepath for the synthetic video
+    :param n_frames: the number of frames in the video
+    :return: list of (name, function, setup, calls per run)
+    """
+    from .frameProvider import FrameProvider
+
+    rng = np.random.default_rng(2)
+    jumps = rng.integers(0, n_frames - 1, size=min(100, n_frames))
+    steps = min(300, n_frames - 1)
+
+    def frame_provider():
+        # A screen big enough that the frames are not resized
+        return FrameProvider(video_name, 100000, 100000)
+
+    def step_through(provider):
+        for frame_number in range(steps):
+            provider.get_frame(frame_number)
+        provider.release()
+
+    def jump_around(provider):
+        for frame_number in jumps:
+            provider.get_frame(frame_number)
+        provider.release()
+
+    return [('frame_navigation_sequential', step_through, frame_provider, steps),
+            ('frame_navigation_random', jump_around, frame_provider, len(jumps))]
+
+
+def run_benchmarks(work_dir, n_frames=100000, n_animals=2, n_bodyparts=6, h5_format='table', video_frames=600,
+                   width=640, height=480, repeats=3, only=None):
+    """
+    Make the synthetic files and time every operation on them
+    :param work_dir: the folder to write the synthetic files in
+    :param n_frames: the number of frames in the H5 file
+    :param n_animals: the number of animals
+    :param n_bodyparts: the number of body points on each animal
+    :param h5_format: the pandas format of the H5 file, table or fixed
+    :param video_frames: the number of frames in the video. 0 skips the video benchmarks
+    :param width: the width of the video
+    :param height: the height of the video
+    :param repeats: the number of timing runs of each operation
+    :param only: the names of the operations to run. Defaults to all of them
+    :return: list with a dictionary of results for each operation
+    """
+    h5_filename = os.path.join(work_dir, f'benchmark_{n_frames}_{n_animals}.h5')
+    make_pose_file(h5_filename, n_frames, n_animals, n_bodyparts, h5_format)
+    benchmarks = pose_benchmarks(h5_filename, n_frames, h5_format)
+
+    if video_frames:
+        video_name = os.path.join(work_dir, f'benchmark_{video_frames}.mp4')
+        coords, _ = synthetic_coordinates(video_frames, n_animals, n_bodyparts, width, height)
+        make_video(video_name, coords, width, height)
+        benchmarks += video_benchmarks(video_name, video_frames)
+
+    results = []
+    for name, function, setup, calls in benchmarks:
+        if only and name not in only:
+            continue
+        result = measure(function, repeats, setup)
+        result.update(name=name, calls=calls, per_call_s=result['median_s'] / calls)
+        results.append(result)
+        print(f"{name:<30} {result['median_s'] * 1000:10.2f} ms  {result['per_call_s'] * 1000:10.4f} ms per call  "
+              f"{result['peak_mb']:8.1f} MB peak", file=sys.stderr)
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Time the correction pipeline on synthetic tracked points and video')
+    parser.add_argument('--frames', type=int, default=100000, help='the number of frames in the H5 file')
+    parser.add_argument('--animals', type=int, default=2, help='the number of animals')
+    parser.add_argument('--bodyparts', type=int, default=6, choices=range(3, len(BODYPARTS) + 1),
+                        help='the number of body points on each animal')
+    parser.add_argument('--format', default='table', choices=['table', 'fixed'], help='the pandas format of the H5')
+    parser.add_argument('--video-frames', type=int, default=600, help='the number of frames in the video, 0 for none')
+    parser.add_argument('--size', type=int, nargs=2, default=(640, 480), metavar=('WIDTH', 'HEIGHT'),
+                        help='the size of the video')
+    parser.add_argument('--repeats', type=int, default=3, help='the number of timing runs of each operation')
+    parser.add_argument('--only', nargs='+', help='the names of the operations to run')
+    parser.add_argument('--work-dir', help='the folder to keep the synthetic files in. Defaults to a temporary one')
+    parser.add_argument('--output', help='the JSON file to write the results to. Defaults to printing them')
+    args = parser.parse_args(args)
+
+    settings = dict(n_frames=args.frames, n_animals=args.animals, n_bodyparts=args.bodyparts, h5_format=args.format,
+                    video_frames=args.video_frames, width=args.size[0], height=args.size[1], repeats=args.repeats,
+                    only=args.only)
+    if args.work_dir:
+        os.makedirs(args.work_dir, exist_ok=True)
+        results = run_benchmarks(args.work_dir, **settings)
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            results = run_benchmarks(work_dir, **settings)
+
+    report = {'settings': settings, 'python': platform.python_version(), 'numpy': np.__version__,
+              'machine': platform.machine(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
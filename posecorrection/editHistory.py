@@ -0,0 +1,164 @@
+import os
+import pickle
+import struct
+from pathlib import Path
+
+from .atomicFile import atomic_write
+
+HISTORY_MAGIC = b'PCHIST01'
+# The start of the history file: the magic bytes and the size and modification time of the H5 file it belongs to
+HEADER = struct.Struct('<8sqq')
+# Every delta is written after its length in bytes, so the deltas can be found without reading them
+LENGTH = struct.Struct('<q')
+
+
+def file_fingerprint(filename):
+    """
+    Get what tells a file apart from a file that replaced it under the same name
+    :param filename: the filepath for the file
+    :return: the size and the modification time in nanoseconds, or None if the file does not exist
+    """
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class EditHistory:
+    """
+    Undo/redo history of the edits applied to a pose store. Each edit is kept on disk as a delta with the frame range,
+    the individuals and the points before and after the edit, so undoing costs as much as the edit itself and the
+    history carries over to the next session. Only the file offsets of the deltas are kept in memory.
+    The history records the size and modification time of the H5 file as the pose store last wrote it, and is
+    discarded when the H5 file has been changed or replaced by something else since
+    """
+
+    def __init__(self, h5_filename):
+        """
+        :param h5_filename: the filepath for the H5 file the history belongs to
+        """
+        self.h5_filename = h5_filename
+        self.history_file = Path(f'{h5_filename}.history')
+        self.position_file = Path(f'{h5_filename}.history.pos')
+        self.offsets = []
+        self.position = 0
+
+        if self.history_file.exists():
+            self.offsets = self._scan()
+            if self.offsets is None:
+                self.offsets = []
+                self.history_file.unlink(missing_ok=True)
+                self.position_file.unlink(missing_ok=True)
+        self.position = min(max(self._read_position(), 0), len(self.offsets))
+
+    def _scan(self):
+        # Find where every delta starts from their lengths, without reading the deltas. A partially written last delta
+        # from a crash is cut off. None if the history is not of the H5 file as it is now
+        offsets = []
+        with open(self.history_file, 'r+b') as fr:
+            header = fr.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return None
+            magic, size, mtime_ns = HEADER.unpack(header)
+            if magic != HISTORY_MAGIC or (size, mtime_ns) != file_fingerprint(self.h5_filename):
+                return None
+
+            end = os.fstat(fr.fileno()).st_size
+            offset = HEADER.size
+            while offset + LENGTH.size <= end:
+                fr.seek(offset)
+                length, = LENGTH.unpack(fr.read(LENGTH.size))
+                if length <= 0 or offset + LENGTH.size + length > end:
+                    break
+                offsets.append(offset)
+                offset += LENGTH.size + length
+            fr.truncate(offset)
+        return offsets
+
+    def _write_header(self, fw):
+        fw.seek(0)
+        fw.write(HEADER.pack(HISTORY_MAGIC, *(file_fingerprint(self.h5_filename) or (0, 0))))
+
+    def _read_position(self):
+        # A missing, empty or damaged position file leaves every edit in the history applied
+        try:
+            return int(self.position_file.read_text())
+        except (FileNotFoundError, ValueError):
+            return len(self.offsets)
+
+    def _read(self, index):
+        with open(self.history_file, 'rb') as fr:
+            fr.seek(self.offsets[index] + LENGTH.size)
+            return pickle.load(fr)
+
+    def _save_position(self):
+        with atomic_write(self.position_file, 'w') as fw:
+            fw.write(str(self.position))
+
+    def mark_saved(self):
+        """
+        Record the H5 file as it is now, once the pose store has written its edits to it
+        :return:
+        """
+        if not self.history_file.exists():
+            return
+        with open(self.history_file, 'r+b') as fw:
+            self._write_header(fw)
+            fw.flush()
+            os.fsync(fw.fileno())
+
+    def record(self, delta):
+        """
+        Add an edit to the history. Edits that were undone can no longer be redone after this
+        :param delta: dictionary with the frame range, individuals, old values and new values of the edit
+        :return:
+        """
+        data = pickle.dumps(delta, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(self.history_file, 'ab') as fw:
+            if fw.tell() < HEADER.size:
+                # A new history starts from the H5 file as it is now
+                fw.truncate(0)
+                self._write_header(fw)
+            if self.position < len(self.offsets):
+                fw.truncate(self.offsets[self.position])
+                del self.offsets[self.position:]
+            fw.seek(0, os.SEEK_END)
+            self.offsets.append(fw.tell())
+            fw.write(LENGTH.pack(len(data)) + data)
+            fw.flush()
+            os.fsync(fw.fileno())
+        self.position = len(self.offsets)
+        self._save_position()
+
+    def undo(self):
+        """
+        Step back one edit
+        :return: the delta of the edit to undo or None if there is nothing to undo
+        """
+        if self.position == 0:
+            return None
+        self.position -= 1
+        self._save_position()
+        return self._read(self.position)
+
+    def redo(self):
+        """
+        Step forward one edit
+        :return: the delta of the edit to redo or None if there is nothing to redo
+        """
+        if self.position == len(self.offsets):
+            return None
+        delta = self._read(self.position)
+        self.position += 1
+        self._save_position()
+        return delta
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < len(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
@@ -0,0 +1,71 @@
+import os
+import pickle
+from pathlib import Path
+
+from .atomicFile import replace_file
+
+
+class EditJournal:
+    """
+    Append-only journal of the edits applied to a pose store. Every edit is pickled to disk as soon as it is made,
+    so corrections that have not been flushed to the H5 file yet survive a crash and are replayed on the next load
+    """
+
+    def __init__(self, h5_filename):
+        """
+        :param h5_filename: the filepath for the H5 file the journal belongs to
+        """
+        self.journal_file = Path(f'{h5_filename}.journal')
+        self.entries = []
+
+        if self.journal_file.exists():
+            self.entries = self.read()
+
+    def read(self):
+        """
+        Read back all the edits written to the journal file. A partially written last entry from a crash is cut off,
+        so the edits appended after it can be read back as well
+        :return: list of journal entries
+        """
+        entries = []
+        with open(self.journal_file, 'r+b') as fr:
+            while True:
+                offset = fr.tell()
+                try:
+                    entries.append(pickle.load(fr))
+                except (EOFError, pickle.UnpicklingError, ValueError):
+                    break
+            fr.truncate(offset)
+        return entries
+
+    def append(self, entry):
+        """
+        Add an edit to the journal
+        :param entry: dictionary with the frame range, individuals and new values of the edit
+        :return:
+        """
+        self.entries.append(entry)
+        with open(self.journal_file, 'ab') as fw:
+            pickle.dump(entry, fw, protocol=pickle.HIGHEST_PROTOCOL)
+            fw.flush()
+            os.fsync(fw.fileno())
+
+    def truncate(self, n_entries):
+        """
+        Drop the first n entries once they have been written to the H5 file
+        :param n_entries: the number of entries that have been flushed
+        :return:
+        """
+        self.entries = self.entries[n_entries:]
+        if not self.entries:
+            self.journal_file.unlink(missing_ok=True)
+            return
+
+        tmp_file = self.journal_file.with_suffix('.journal.tmp')
+        with open(tmp_file, 'wb') as fw:
+            for entry in self.entries:
+                pickle.dump(entry, fw, protocol=pickle.HIGHEST_PROTOCOL)
+        replace_file(tmp_file, self.journal_file)
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,102 +1,130 @@
-import pandas as pd
+import os
 import numpy as np
 from pathlib import Path
 
+from .poseStore import read_coordinates, iter_coordinates
+from .trackingRules import (set_tracking_rules, score_individuals, frame_scores, flag_details, rule_values, median_mad,
+                           BAD_FRAME_DTYPE)
 
-def cal_animal_area(h5_data=None, scorer="Stacked_Autoencoder", individual='ind1'):
-    """
-    Calculate the area of the animal assuming it has an ellipsoid shape
 
-    Parameters
-    ----------
-    h5_data: h5 data or path to h5 data
-    scorer: the annotator/scorer of h5 file
-    individual: which individual to calculate its area
+def bad_tracking_file(file):
     """
-    if not isinstance(h5_data, pd.DataFrame):
-        h5 = pd.read_hdf(h5_data)
-    else:
-        h5 = h5_data
-
-    nose = h5[scorer][individual].loc[:, 'Nose']
-    left_mid = h5[scorer][individual].loc[:, 'leftMidWaist']
-    bodypart = h5[scorer][individual].loc[:, ['leftMidWaist', 'rightMidWaist']]
-    center = bodypart.leftMidWaist.add(bodypart.rightMidWaist).divide(2)
-    a_len = nose.sub(center)
-    b_len = center.sub(left_mid)
-    a_dist = np.linalg.norm(a_len, axis=1)
-    b_dist = np.linalg.norm(b_len, axis=1)
-    area = np.pi * a_dist * b_dist
-    area_df = pd.DataFrame({'area': area})
-
-    return area_df
+    Get the filepath the bad tracking frames of an H5 file are saved to
+    :param file: the filepath for the H5 file
+    :return: the filepath for the bad tracking file
+    """
+    destination_name = Path(file).stem
+    destination_name = destination_name[:destination_name.find('CNN')]
+    destination_name += 'bad_tracking.npy'
+    return f'{str(Path(file).parent)}/{destination_name}'
 
 
-def cal_bodyparts_dist(h5_data=None, body_part1='Nose', body_part2='betweenEars',
-                       scorer="Stacked_Autoencoder", individual='ind1'):
+def find_bad_tracking(file, rules=None, pose_store=None):
     """
-    Calculate the distance between body parts
-
-    Parameters
-    ----------
-    h5_data: h5 data or path to h5 data
-    body_part1: the first body point to use
-    body_part2: the second boyd point to use
-    scorer: the annotator/scorer of h5 file
-    individual: which individual to calculate its area
+    Score every frame of an H5 file against the bad tracking rules and save the frames that break them, with the
+    rules they break and the individuals that break them
+    :param file: the filepath for the H5 file
+    :param rules: the settings of the rules, e.g. the bad_tracking section of config.yaml. Defaults to the default rules
+    :param pose_store: the PoseStore of the file if it is already loaded, so the H5 file does not have to be read again.
+        A copy of its points is scored, so it can be edited meanwhile
+    :return: dictionary with the per-frame score of each rule
     """
-    if not isinstance(h5_data, pd.DataFrame):
-        h5 = pd.read_hdf(h5_data)
+    if pose_store is not None:
+        coords, bodyparts = pose_store.snapshot(), pose_store.bodyparts
     else:
-        h5 = h5_data
-
-    bpt1 = h5[scorer][individual].loc[:, body_part1]
-    bpt2 = h5[scorer][individual].loc[:, body_part2]
-    bpts_diff = bpt1.sub(bpt2)
-    bpts_dist = np.linalg.norm(bpts_diff, axis=1)
-    bpts_df = pd.DataFrame({'bpts_dist': bpts_dist})
-
-    return bpts_df
-
+        coords, _, _, bodyparts = read_coordinates(file)
 
-# noinspection PyTypeChecker
-def find_bad_tracking(file):
-    mad_multiplier = 2.75
+    individual_scores = score_individuals(coords, bodyparts, rules)
+    bad_tracking_list = flag_details(individual_scores, rules)
 
-    h5 = pd.read_hdf(file)
-    scorer = h5.columns.get_level_values('scorer').unique().item()
-    individuals = h5.columns.get_level_values('individuals').unique().to_list()
+    np.save(bad_tracking_file(file), bad_tracking_list)
 
-    body_parts_list = [['Nose', 'betweenEars'], ['tailStart', 'midHip']]
+    return frame_scores(individual_scores)
 
-    bad_tracking_list = []
-    for ind in individuals:
 
-        area = cal_animal_area(h5, scorer=scorer, individual=ind)
-        area_thresh = (area.median() * 0.5).item()
-        bad_area1 = np.where(area.values < area.median().item() - area_thresh)[0]
-        bad_area2 = np.where(area.values > area.median().item() + area_thresh)[0]
-        bad_area = np.concatenate((bad_area1, bad_area2))
-        bad_area = np.unique(bad_area)
+def sample_tracking_stats(file, rules=None, chunksize=100000, sample_size=200000):
+    """
+    First pass of the chunked scan. Estimate the medians and MADs of the rules from an evenly spaced sample of the
+    frames, so the whole file never has to be in memory
+    :param file: the filepath for the H5 file
+    :param rules: the rules from set_tracking_rules. Defaults to the default rules
+    :param chunksize: the number of frames to read at a time
+    :param sample_size: the largest number of frames to keep for the estimate
+    :return: dictionary with the (median, mad) of each rule
+    """
+    rules = set_tracking_rules(rules)
+    stride = 1
+    sample_frames = np.zeros(0, dtype=np.int64)
+    samples = {}
+
+    for first, coords, _, bodyparts in iter_coordinates(file, chunksize, overlap=1):
+        # The first frame of every block but the first repeats the end of the previous block for the velocities
+        skip = 1 if first > 0 else 0
+        frames = np.arange(first + skip, first + len(coords))
+        keep = frames % stride == 0
+        sample_frames = np.concatenate((sample_frames, frames[keep]))
+        for name, value in rule_values(coords, bodyparts, rules).items():
+            value = value[skip:][keep]
+            samples[name] = np.concatenate((samples[name], value)) if name in samples else value
+
+        # Thin out the sample by half whenever it gets too big
+        while len(sample_frames) > sample_size:
+            stride *= 2
+            keep = sample_frames % stride == 0
+            sample_frames = sample_frames[keep]
+            samples = {name: value[keep] for name, value in samples.items()}
+
+    return {name: median_mad(value) for name, value in samples.items()}
+
+
+def iter_bad_tracking(file, rules=None, chunksize=100000, sample_size=200000):
+    """
+    Scan an H5 file for bad tracking one block of frames at a time
+    :param file: the filepath for the H5 file
+    :param rules: the settings of the rules. Defaults to the default rules
+    :param chunksize: the number of frames to read at a time
+    :param sample_size: the largest number of frames used to estimate the medians and MADs
+    :return: generator of the bad frames of each block, as arrays with the BAD_FRAME_DTYPE fields sorted by frame
+    """
+    rules = set_tracking_rules(rules)
+    stats = sample_tracking_stats(file, rules, chunksize, sample_size)
 
-        bad_tracking_list.extend(bad_area.tolist())
-        for bpts in body_parts_list:
-            bpts_dist = cal_bodyparts_dist(h5, body_part1=bpts[0], body_part2=bpts[1],
-                                           scorer=scorer, individual=ind)
-            mad = (bpts_dist - bpts_dist.mean()).abs().median()
-            bpts_dist_thresh = (mad_multiplier * mad).item()
-            bad_bpts_dist1 = np.where(bpts_dist.values < bpts_dist.median().item() - bpts_dist_thresh)[0]
-            bad_bpts_dist2 = np.where(bpts_dist.values > bpts_dist.median().item() + bpts_dist_thresh)[0]
-            bad_bpts_dist = np.concatenate((bad_bpts_dist1, bad_bpts_dist2))
-            bad_bpts_dist = np.unique(bad_bpts_dist)
+    for first, coords, _, bodyparts in iter_coordinates(file, chunksize, overlap=1):
+        skip = 1 if first > 0 else 0
+        flagged = flag_details(score_individuals(coords, bodyparts, rules, stats), rules)
+        flagged = flagged[flagged['frame'] >= skip]
+        flagged['frame'] += first
+        yield flagged
 
-            bad_tracking_list.extend(bad_bpts_dist.tolist())
-    bad_tracking_list = np.array(bad_tracking_list)
 
-    destination_name = Path(file).stem
-    destination_name = destination_name[:destination_name.find('CNN')]
-    destination_name += 'bad_tracking.npy'
-    destination_file = f'{str(Path(file).parent)}/{destination_name}'
-    np.save(destination_file, bad_tracking_list)
+def find_bad_tracking_chunked(file, rules=None, chunksize=100000, sample_size=200000):
+    """
+    Find the bad tracking frames of an H5 file that is too big to load at once and save them. Memory use depends on
+    the chunk and sample sizes, not on the length of the recording. Only H5 files saved in the table format can be
+    read in chunks
+    :param file: the filepath for the H5 file
+    :param rules: the settings of the rules. Defaults to the default rules
+    :param chunksize: the number of frames to read at a time
+    :param sample_size: the largest number of frames used to estimate the medians and MADs
+    :return: the number of bad frames
+    """
+    destination_file = bad_tracking_file(file)
+    tmp_file = f'{destination_file}.tmp'
+
+    n_flagged = 0
+    with open(tmp_file, 'wb') as fw:
+        for flagged in iter_bad_tracking(file, rules, chunksize, sample_size):
+            flagged.tofile(fw)
+            n_flagged += len(flagged)
+
+    if n_flagged:
+        bad_tracking_list = np.lib.format.open_memmap(destination_file, mode='w+', dtype=BAD_FRAME_DTYPE,
+                                                      shape=(n_flagged,))
+        bad_tracking_list[:] = np.memmap(tmp_file, dtype=BAD_FRAME_DTYPE, mode='r', shape=(n_flagged,))
+        bad_tracking_list.flush()
+        del bad_tracking_list
+    else:
+        np.save(destination_file, np.zeros(0, dtype=BAD_FRAME_DTYPE))
+    os.remove(tmp_file)
 
-    return
+    return n_flagged
@@ -0,0 +1,167 @@
+import threading
+from collections import OrderedDict
+import cv2
+
+from .processFrame import process_frame, display_size
+from .latencyTelemetry import span
+
+
+class FrameProvider:
+    """
+    Wraps cv2.VideoCapture for navigating the video. Frames are decoded ahead of the cursor on a background thread
+    and kept, already resized for the GUI, in an LRU cache. The decoder is only seeked when the requested frame is not
+    the next frame it is going to return. When a proxy of the video is given, the frames for the GUI are decoded from
+    the proxy and only read_raw reads the original video. Frames that are in the frame store, when one is attached, are
+    fetched from it without decoding
+    """
+
+    def __init__(self, video_name, screen_height, screen_width, cache_size=64, read_ahead=24, proxy_name=None):
+        """
+        :param video_name: the filepath for the video
+        :param screen_height: the height of the computer screen
+        :param screen_width: the width of the computer screen
+        :param cache_size: the number of resized frames to keep in memory
+        :param read_ahead: the number of frames to decode ahead of the current frame
+        :param proxy_name: the filepath for a scaled down proxy of the video, from proxyVideo.make_proxy
+        """
+        self.video_name = video_name
+        self.screen_height = screen_height
+        self.screen_width = screen_width
+        self.cache_size = cache_size
+        self.read_ahead = read_ahead
+
+        self.proxy_name = proxy_name
+
+        self.raw_cap = cv2.VideoCapture(video_name)
+        if not self.raw_cap.isOpened():
+            raise ValueError(f'Unable to open {video_name}')
+        self.length = int(self.raw_cap.get(cv2.CAP_PROP_FRAME_COUNT)) - 1
+        self.width = int(self.raw_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.raw_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        # Frames are shown at the size of the original frames, whichever video they are decoded from, so the points
+        # keep lining up with the image
+        self.display_dim = display_size(self.height, self.width, screen_height, screen_width)
+
+        self.cap = self.raw_cap
+        if proxy_name is not None:
+            self.cap = cv2.VideoCapture(proxy_name)
+            if not self.cap.isOpened():
+                raise ValueError(f'Unable to open {proxy_name}')
+        self._next_raw = 0
+        self.frame_store = None
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cap_lock = threading.Lock()
+        self._next_decode = 0
+        self._cursor = 0
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._read_ahead_worker, daemon=True)
+        self._worker.start()
+
+    def _read(self, frame_number):
+        # Must be called with the capture lock held
+        with span('cap.read'):
+            if frame_number != self._next_decode:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            ret, image = self.cap.read()
+        self._next_decode = frame_number + 1
+        if not ret:
+            self._next_decode = -1
+            return None
+        return image
+
+    def _decode(self, frame_number):
+        # Must be called with the capture lock held
+        image = self._read(frame_number)
+        if image is None:
+            return None
+        with span('process_frame'):
+            image = process_frame(image, self.screen_height, self.screen_width, self.display_dim)
+
+        with self._cache_lock:
+            self._cache[frame_number] = image
+            self._cache.move_to_end(frame_number)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return image
+
+    def _cached(self, frame_number):
+        with self._cache_lock:
+            image = self._cache.get(frame_number)
+            if image is not None:
+                self._cache.move_to_end(frame_number)
+            return image
+
+    def get_frame(self, frame_number):
+        """
+        Get the resized frame for the GUI
+        :param frame_number: the frame number
+        :return: the resized image or None if the frame could not be read
+        """
+        frame_number = min(max(int(frame_number), 0), self.length)
+        self._cursor = frame_number
+
+        with span('get_frame'):
+            if self.frame_store is not None:
+                image = self.frame_store.get(frame_number)
+                if image is not None:
+                    return image
+
+            image = self._cached(frame_number)
+            if image is None:
+                with self._cap_lock:
+                    image = self._cached(frame_number)
+                    if image is None:
+                        image = self._decode(frame_number)
+
+        self._wake.set()
+        return image
+
+    def read_raw(self, frame_number):
+        """
+        Read the frame at the original resolution of the video
+        :param frame_number: the frame number
+        :return: the image or None if the frame could not be read
+        """
+        with self._cap_lock:
+            if self.cap is self.raw_cap:
+                return self._read(frame_number)
+            if frame_number != self._next_raw:
+                self.raw_cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            ret, image = self.raw_cap.read()
+            self._next_raw = frame_number + 1 if ret else -1
+            return image if ret else None
+
+    def _read_ahead_worker(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+
+            cursor = self._cursor
+            last_frame = min(cursor + self.read_ahead, self.length)
+            for frame_number in range(cursor + 1, last_frame + 1):
+                # Give up on the current run if the user has moved somewhere else
+                if self._stop.is_set() or self._cursor != cursor:
+                    break
+                if self._cached(frame_number) is not None:
+                    continue
+                if self.frame_store is not None and self.frame_store.get(frame_number) is not None:
+                    continue
+                with self._cap_lock:
+                    if self._decode(frame_number) is None:
+                        break
+
+    def release(self):
+        """
+        Stop the read-ahead thread and release the video
+        :return:
+        """
+        self._stop.set()
+        self._wake.set()
+        self._worker.join()
+        with self._cap_lock:
+            self.cap.release()
+            self.raw_cap.release()
@@ -0,0 +1,112 @@
+import os
+import cv2
+import numpy as np
+
+from .processFrame import process_frame
+
+
+def frame_store_file(video_name):
+    """
+    Get the filepath the decoded frames of a video are stored in
+    :param video_name: the filepath for the video
+    :return: the filepath for the frame store and the filepath for the record of which frames it holds
+    """
+    return f'{video_name}.frames.npy', f'{video_name}.frames.filled.npy'
+
+
+class FrameStore:
+    """
+    On-disk store of the decoded frames of a video, already resized for the GUI, in a memory-mapped array indexed by
+    frame number. It is filled by decoding the video once from start to end, after which any frame can be fetched as a
+    view of the array without seeking or decoding. The store takes length * height * width * 3 bytes on disk
+    """
+
+    def __init__(self, video_name, length, dim):
+        """
+        :param video_name: the filepath for the video
+        :param length: the number of frames in the video
+        :param dim: the (width, height) the frames are shown at
+        """
+        self.video_name = video_name
+        self.file, self.filled_file = frame_store_file(video_name)
+        shape = (length, dim[1], dim[0], 3)
+
+        self.frames = None
+        if os.path.exists(self.file) and os.path.getmtime(self.file) >= os.path.getmtime(video_name):
+            try:
+                frames = np.load(self.file, mmap_mode='r+')
+                if frames.shape == shape and frames.dtype == np.uint8:
+                    self.frames = frames
+            except ValueError:
+                pass
+
+        self.filled = np.zeros(length, dtype=bool)
+        if self.frames is None:
+            self.frames = np.lib.format.open_memmap(self.file, mode='w+', dtype=np.uint8, shape=shape)
+        elif os.path.exists(self.filled_file):
+            filled = np.load(self.filled_file)
+            if filled.shape == self.filled.shape:
+                self.filled = filled
+
+    @property
+    def complete(self):
+        return bool(self.filled.all())
+
+    def get(self, frame_number):
+        """
+        Get a stored frame
+        :param frame_number: the frame number
+        :return: a view of the frame in the store or None if it has not been stored
+        """
+        if 0 <= frame_number < len(self.filled) and self.filled[frame_number]:
+            return self.frames[frame_number]
+        return None
+
+    def fill(self, screen_height, screen_width, source=None, progress=None, stop_event=None, flush_every=500):
+        """
+        Decode the video from the first frame that is missing to the end and store the frames. The video is only
+        seeked once, so this is much faster than reading the frames one by one
+        :param screen_height: the height of the computer screen
+        :param screen_width: the width of the computer screen
+        :param source: the filepath for a proxy of the video to decode instead, which is much faster to decode
+        :param progress: called with the number of frames stored and the number of frames in the video
+        :param stop_event: threading.Event that stops the decoding when it is set. The frames stored so far are kept
+        :param flush_every: the number of frames between writes of the store to disk
+        :return: True if every frame is stored
+        """
+        missing = np.flatnonzero(~self.filled)
+        if len(missing) == 0:
+            return True
+        dim = (self.frames.shape[2], self.frames.shape[1])
+
+        cap = cv2.VideoCapture(source or self.video_name)
+        try:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(missing[0]))
+            for frame_number in range(int(missing[0]), len(self.filled)):
+                if stop_event is not None and stop_event.is_set():
+                    break
+                ret, image = cap.read()
+                if not ret:
+                    break
+                if not self.filled[frame_number]:
+                    self.frames[frame_number] = process_frame(image, screen_height, screen_width, dim)
+                    # Only mark the frame once it is written, so a reader never gets a half written frame
+                    self.filled[frame_number] = True
+                if frame_number % flush_every == 0:
+                    self.flush()
+                    if progress is not None:
+                        progress(frame_number, len(self.filled))
+        finally:
+            cap.release()
+            self.flush()
+        return self.complete
+
+    def flush(self):
+        """
+        Write the stored frames and the record of which frames are stored to disk
+        :return:
+        """
+        self.frames.flush()
+        tmp_file = f'{self.filled_file}.tmp.npy'
+        np.save(tmp_file, self.filled)
+        os.replace(tmp_file, self.filled_file)
@@ -0,0 +1,102 @@
+import warnings
+from itertools import permutations
+import numpy as np
+
+
+def identity_costs(coords, chunksize=10000):
+    """
+    Calculate the cost of matching every animal in one frame to every label in the next frame. The cost is the mean
+    distance between the body points of the animal and the label, or the distance between their centroids when they
+    have no tracked body point in common
+    :param coords: the coordinates with shape (frames, individuals, bodyparts, 2)
+    :param chunksize: the number of frames to compare at a time, to bound the memory used
+    :return: the costs with shape (frames, individuals, individuals). costs[t, i, j] is the cost of animal i in frame
+        t - 1 being label j in frame t. The first frame is NaN
+    """
+    n_frames, n_individuals = coords.shape[:2]
+    costs = np.full((n_frames, n_individuals, n_individuals), np.nan)
+
+    with warnings.catch_warnings():
+        # Frames or animals without any tracked body points give NaN costs
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        for start in range(1, n_frames, chunksize):
+            stop = min(start + chunksize, n_frames)
+            previous = coords[start - 1:stop - 1, :, None]
+            current = coords[start:stop, None, :]
+            bodypart_cost = np.nanmean(np.linalg.norm(previous - current, axis=-1), axis=-1)
+            centroid_cost = np.linalg.norm(np.nanmean(previous, axis=-2) - np.nanmean(current, axis=-2), axis=-1)
+            costs[start:stop] = np.where(np.isnan(bodypart_cost), centroid_cost, bodypart_cost)
+
+    return costs
+
+
+def best_assignments(costs, margin=0.5, chunksize=1000):
+    """
+    Find the cheapest way to match the animals of each frame to the labels of the next frame
+    :param costs: the costs from identity_costs
+    :param margin: how much cheaper than keeping the labels a different assignment has to be, as a fraction of the cost
+        of keeping the labels, before it counts as a swap
+    :param chunksize: the number of frames to check every permutation for at a time, to bound the memory used
+    :return: the assignments with shape (frames, individuals). assignments[t, i] is the label of animal i of frame t - 1
+        in frame t. Frames without a clear swap keep the labels
+    """
+    n_frames, n_individuals = costs.shape[:2]
+    identity = np.arange(n_individuals)
+    assignments = np.broadcast_to(identity, (n_frames, n_individuals)).copy()
+    if n_individuals < 2:
+        return assignments
+
+    keep_cost = costs[:, identity, identity].sum(axis=1)
+    if n_individuals <= 6:
+        # Checking every permutation at once is faster than solving each frame when there are only a few animals
+        candidates = np.array(list(permutations(range(n_individuals))))
+        best_cost = np.empty(n_frames)
+        best_assignment = np.empty_like(assignments)
+        for start in range(0, n_frames, chunksize):
+            stop = min(start + chunksize, n_frames)
+            candidate_cost = costs[start:stop, identity, candidates].sum(axis=2)
+            best = np.argmin(np.where(np.isnan(candidate_cost), np.inf, candidate_cost), axis=1)
+            best_cost[start:stop] = candidate_cost[np.arange(stop - start), best]
+            best_assignment[start:stop] = candidates[best]
+    else:
+        from scipy.optimize import linear_sum_assignment
+        best_cost = np.full(n_frames, np.nan)
+        best_assignment = assignments.copy()
+        for frame in np.flatnonzero(~np.isnan(costs).any(axis=(1, 2))):
+            _, best_assignment[frame] = linear_sum_assignment(costs[frame])
+            best_cost[frame] = costs[frame, identity, best_assignment[frame]].sum()
+
+    with np.errstate(invalid='ignore'):
+        swapped = best_cost < keep_cost * (1 - margin)
+    assignments[swapped] = best_assignment[swapped]
+    return assignments
+
+
+def propose_swaps(coords, margin=0.5):
+    """
+    Follow the identity of every animal through the frames and find the segments where the labels are swapped
+    :param coords: the coordinates with shape (frames, individuals, bodyparts, 2)
+    :param margin: how much cheaper a different assignment has to be to count as a swap. See best_assignments
+    :return: list of (start frame, end frame, order) segments. The end frame is included and the order is the label of
+        each animal in the segment, which is the order to pass to swap_label_sequences to fix it
+    """
+    coords = np.asarray(coords, dtype=float)
+    n_frames, n_individuals = coords.shape[:2]
+    identity = np.arange(n_individuals)
+    assignments = best_assignments(identity_costs(coords), margin)
+
+    # The labels only change at the frames with a swap, so the running order is updated at those frames only
+    swap_frames = np.flatnonzero((assignments != identity).any(axis=1))
+    segments = []
+    order = identity
+    segment_start = 0
+    for frame in swap_frames:
+        new_order = assignments[frame][order]
+        if not np.array_equal(order, identity):
+            segments.append((segment_start, frame - 1, order.tolist()))
+        order = new_order
+        segment_start = frame
+    if len(swap_frames) and not np.array_equal(order, identity):
+        segments.append((segment_start, n_frames - 1, order.tolist()))
+
+    return segments
@@ -0,0 +1,130 @@
+import cv2
+import numpy as np
+
+
+def track_keypoints(images, points, win_size=21, max_level=3, max_error=2.0, min_tracked=0.0):
+    """
+    Follow points through a sequence of frames with pyramidal Lucas-Kanade optical flow. Every point is also tracked
+    back to the previous frame and is dropped once it does not land close to where it started
+    :param images: iterable of frames. The points are known in the first frame
+    :param points: the points in the first frame with shape (points, 2). NaN points are not tracked
+    :param win_size: the size of the search window at each pyramid level
+    :param max_level: the number of pyramid levels
+    :param max_error: how far in pixels a point tracked forward and back can be from where it started
+    :param min_tracked: stop once the fraction of the starting points that are still tracked drops below this
+    :return: the tracked points with shape (frames, points, 2). Points are NaN from the frame they are lost. Stops
+        early, returning fewer frames, once every point is lost or too few are left
+    """
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+    lk_params = dict(winSize=(win_size, win_size), maxLevel=max_level,
+                     criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01))
+
+    n_start = max(int((~np.isnan(points).any(axis=1)).sum()), 1)
+    tracks = []
+    previous_gray = None
+    for image in images:
+        if image is None:
+            # A frame that could not be read ends the tracking, as if every point was lost
+            break
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        if previous_gray is None:
+            tracks.append(points.copy())
+        else:
+            tracked = ~np.isnan(points).any(axis=1)
+            if not tracked.any():
+                break
+            p0 = points[tracked].reshape(-1, 1, 2)
+            p1, status, _ = cv2.calcOpticalFlowPyrLK(previous_gray, gray, p0, None, **lk_params)
+            p0_back, status_back, _ = cv2.calcOpticalFlowPyrLK(gray, previous_gray, p1, None, **lk_params)
+            error = np.linalg.norm(p0_back - p0, axis=-1).ravel()
+            good = (status.ravel() == 1) & (status_back.ravel() == 1) & (error < max_error)
+
+            if good.sum() / n_start < min_tracked:
+                break
+            points = np.full_like(points, np.nan)
+            points[np.flatnonzero(tracked)[good]] = p1.reshape(-1, 2)[good]
+            tracks.append(points.copy())
+        previous_gray = gray
+
+    return np.array(tracks, dtype=float).reshape(-1, *points.shape)
+
+
+def read_frames(video_name, frame_number, n_frames, stop_event=None):
+    """
+    Decode frames of a video one after the other, with a video reader of its own so it can run next to the GUI
+    :param video_name: the filepath for the video
+    :param frame_number: the first frame to read
+    :param n_frames: the number of frames to read
+    :param stop_event: threading.Event that stops the reading early when it is set
+    :return: generator of the frames at the original resolution
+    """
+    cap = cv2.VideoCapture(video_name)
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        for _ in range(n_frames):
+            if stop_event is not None and stop_event.is_set():
+                return
+            ret, image = cap.read()
+            if not ret:
+                return
+            yield image
+    finally:
+        cap.release()
+
+
+def read_gray_frames(video_name, frame_number, n_frames, scale=1.0, stop_event=None):
+    """
+    Decode frames of a video as grayscale images resized by a scale, small enough to keep many of them in memory
+    :param video_name: the filepath for the video
+    :param frame_number: the first frame to read
+    :param n_frames: the number of frames to read
+    :param scale: the scale from the original resolution to the returned images
+    :param stop_event: threading.Event that stops the reading early when it is set
+    :return: generator of the grayscale frames
+    """
+    for image in read_frames(video_name, frame_number, n_frames, stop_event):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if scale != 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        yield gray
+
+
+def track_points(video_name, frame_number, points, steps, min_tracked=0.5, stop_event=None):
+    """
+    Carry points of a frame forward with optical flow, until the number of steps is reached or the flow loses too
+    many of the points
+    :param video_name: the filepath for the video
+    :param frame_number: the frame the points are in
+    :param points: the points with shape (..., 2)
+    :param steps: the number of frames to track forward
+    :param min_tracked: stop once the fraction of the points that are still tracked drops below this
+    :param stop_event: threading.Event that stops the tracking early when it is set
+    :return: the tracked points with shape (frames, ..., 2), starting with the frame after frame_number. Points are NaN
+        from the frame they are lost
+    """
+    points = np.asarray(points, dtype=float)
+    images = read_frames(video_name, frame_number, steps + 1, stop_event)
+    tracks = track_keypoints(images, points.reshape(-1, 2), min_tracked=min_tracked)[1:]
+    return tracks.reshape((-1,) + points.shape)
+
+
+def track_forward(pose_store, video_name, frame_number, steps, animal_ident='both', min_tracked=0.5,
+                  stop_event=None):
+    """
+    Carry the body points of a frame forward with optical flow, until the number of steps is reached or the flow
+    loses too many of the points
+    :param pose_store: the PoseStore with the tracked points
+    :param video_name: the filepath for the video
+    :param frame_number: the frame with the corrected body points
+    :param steps: the number of frames to track forward
+    :param animal_ident: the animal identity or identities to track
+    :param min_tracked: stop once the fraction of the points that are still tracked drops below this
+    :param stop_event: threading.Event that stops the tracking early when it is set
+    :return: the individual indices and the tracked points with shape (frames, individuals, bodyparts, 2), starting
+        with the frame after frame_number. Points that were lost keep their tracked positions
+    """
+    individuals = pose_store.individual_indices(animal_ident)
+    tracks = track_points(video_name, frame_number, pose_store.coords[frame_number, individuals], steps, min_tracked,
+                          stop_event)
+    tracked = pose_store.coords[frame_number + 1:frame_number + 1 + len(tracks), individuals]
+    return individuals, np.where(np.isnan(tracks), tracked, tracks)
@@ -0,0 +1,59 @@
+import numpy as np
+
+
+class KeypointGrid:
+    """
+    Uniform grid over the body points of the current frame. Used to find the body point under or nearest to the
+    cursor without checking every individual and body part
+    """
+
+    def __init__(self, body_points, cell_size=20):
+        """
+        :param body_points: the points with shape (individuals, bodyparts, 2). NaN points are left out
+        :param cell_size: the size of a grid cell in pixels
+        """
+        self.cell_size = cell_size
+        self.body_points = np.array(body_points, dtype=float)
+        self.cells = {}
+
+        for k1, k2 in zip(*np.nonzero(~np.isnan(self.body_points).any(axis=-1))):
+            self.cells.setdefault(self._cell(*self.body_points[k1, k2]), []).append((int(k1), int(k2)))
+
+    def _cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def move(self, key, x, y):
+        """
+        Update the position of a body point after it has been dragged
+        :param key: the (individual, bodypart) indices of the point
+        :param x: the new x position
+        :param y: the new y position
+        :return:
+        """
+        old_x, old_y = self.body_points[key]
+        if not np.isnan(old_x) and not np.isnan(old_y):
+            self.cells[self._cell(old_x, old_y)].remove(key)
+        self.body_points[key] = (x, y)
+        self.cells.setdefault(self._cell(x, y), []).append(key)
+
+    def nearest(self, x, y, radius):
+        """
+        Find the body point nearest to a position
+        :param x: the x position
+        :param y: the y position
+        :param radius: the largest distance a point can be from the position
+        :return: the (individual, bodypart) indices of the nearest point or None if none is within the radius
+        """
+        cell_x, cell_y = self._cell(x, y)
+        reach = int(np.ceil(radius / self.cell_size))
+
+        best_key = None
+        best_dist = radius
+        for i in range(cell_x - reach, cell_x + reach + 1):
+            for j in range(cell_y - reach, cell_y + reach + 1):
+                for key in self.cells.get((i, j), ()):
+                    dist = np.hypot(*(self.body_points[key] - (x, y)))
+                    if dist <= best_dist:
+                        best_key = key
+                        best_dist = dist
+        return best_key
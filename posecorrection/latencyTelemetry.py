@@ -0,0 +1,154 @@
+import functools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+
+# The upper edges of the histogram buckets in milliseconds. The last bucket holds everything slower
+BUCKET_EDGES_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class LatencyStats:
+    """
+    The timings of one stage or action: a histogram of every timing and the most recent timings for percentiles
+    """
+
+    def __init__(self, n_recent=1000):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = np.zeros(len(BUCKET_EDGES_MS) + 1, dtype=np.int64)
+        self.recent = deque(maxlen=n_recent)
+
+    def add(self, milliseconds):
+        self.count += 1
+        self.total_ms += milliseconds
+        self.max_ms = max(self.max_ms, milliseconds)
+        self.buckets[np.searchsorted(BUCKET_EDGES_MS, milliseconds)] += 1
+        self.recent.append(milliseconds)
+
+    def summary(self):
+        """
+        :return: dictionary with the count, the mean, the percentiles of the recent timings, the maximum and the
+            histogram, all in milliseconds
+        """
+        p50, p90, p99 = np.percentile(self.recent, [50, 90, 99]) if self.recent else (0.0, 0.0, 0.0)
+        return {'count': self.count, 'mean_ms': self.total_ms / max(self.count, 1), 'p50_ms': float(p50),
+                'p90_ms': float(p90), 'p99_ms': float(p99), 'max_ms': self.max_ms,
+                'histogram': {'edges_ms': BUCKET_EDGES_MS, 'counts': self.buckets.tolist()}}
+
+
+class Telemetry:
+    """
+    Keeps in memory how long each stage of the navigation and edit actions takes, e.g. reading a frame from the video,
+    resizing it, converting it for Qt and plotting the points. Timings can come from any thread
+    """
+
+    def __init__(self, enabled=True):
+        """
+        :param enabled: record the timings. When disabled the spans do nothing
+        """
+        self.enabled = enabled
+        self.started = time.time()
+        self.stats = {}
+        self.last_action = None
+        self._lock = threading.Lock()
+
+    def record(self, name, milliseconds):
+        """
+        Add a timing
+        :param name: the name of the stage or action. Actions are named "action: <name>"
+        :param milliseconds: how long it took
+        :return:
+        """
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = LatencyStats()
+            stats.add(milliseconds)
+            if name.startswith('action: '):
+                self.last_action = name
+
+    @contextmanager
+    def span(self, name):
+        """
+        Time the code in a with block
+        :param name: the name of the stage or action
+        :return:
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def summary(self):
+        """
+        :return: dictionary with the summary of each stage and action
+        """
+        with self._lock:
+            return {name: stats.summary() for name, stats in sorted(self.stats.items())}
+
+    def status_text(self, stages=()):
+        """
+        A short line for the status bar with the last action and the stages it is made of
+        :param stages: the names of the stages to show, if they have been timed
+        :return: the text
+        """
+        with self._lock:
+            parts = []
+            if self.last_action is not None:
+                stats = self.stats[self.last_action]
+                p50, p90 = np.percentile(stats.recent, [50, 90])
+                parts.append(f'{self.last_action[len("action: "):]} {p50:.1f} ms (p90 {p90:.1f})')
+            for name in stages:
+                if name in self.stats:
+                    parts.append(f'{name} {np.median(self.stats[name].recent):.1f}')
+        return ' | '.join(parts)
+
+    def dump(self, log_file):
+        """
+        Append the timings of this session to a log with one JSON object per line
+        :param log_file: the filepath for the log
+        :return:
+        """
+        session = {'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                   'ended': time.strftime('%Y-%m-%dT%H:%M:%S'), 'stats': self.summary()}
+        with open(Path(log_file), 'a') as fw:
+            fw.write(json.dumps(session) + '\n')
+
+
+telemetry = Telemetry()
+
+
+def span(name):
+    """
+    Time the code in a with block with the shared telemetry
+    :param name: the name of the stage or action
+    :return: the context manager
+    """
+    return telemetry.span(name)
+
+
+def timed_action(name):
+    """
+    Decorator that times every call of a GUI action with the shared telemetry. Arguments the function does not take,
+    such as the checked flag Qt passes from buttons, are dropped
+    :param name: the name of the action
+    :return: the decorator
+    """
+    def decorator(function):
+        n_args = function.__code__.co_argcount
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with telemetry.span(f'action: {name}'):
+                return function(*args[:n_args], **kwargs)
+        return wrapper
+    return decorator
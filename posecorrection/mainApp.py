@@ -1,37 +1,54 @@
 import os.path
 import sys
+import time
 from pathlib import Path
 import yaml
-import cv2
-import pandas as pd
 import numpy as np
+import cv2
 
 from PyQt5 import QtWidgets, QtGui
 from PyQt5.QtWidgets import (QApplication, QGraphicsView,
                              QGraphicsScene, QGraphicsEllipseItem, QMainWindow,
                              QGraphicsRectItem, QSizePolicy, QGraphicsPixmapItem, QGraphicsSimpleTextItem,
                              QAction, QMenu, QSystemTrayIcon, QFileDialog, QToolBar)
-from PyQt5.QtCore import Qt, QPointF
+from PyQt5.QtCore import Qt, QPointF, QTimer
 from PyQt5.QtGui import QTransform, QPixmap, QImage, QIcon, QKeySequence
 
-from setRunParameters import set_run_parameters
-from processFrame import process_frame
-from qImageProcess import qt_image_process
-from plotTrackedPoints import plot_tracked_points
-from saveLastFrameNumber import save_last_frame_number
-from swapLabels import swap_labels, swap_label_sequences
-from propagateFrame import propagate_frame
-from updateH5file import update_h5file
-from saveFrames import save_frame
-from findBadTracking import find_bad_tracking
-from moveToIndex import move_to_index
+from .setRunParameters import set_run_parameters
+from .frameProvider import FrameProvider
+from .qImageProcess import FrameConverter
+from .plotTrackedPoints import plot_tracked_points
+from .saveLastFrameNumber import save_last_frame_numbers
+from .swapLabels import swap_labels, swap_label_sequences, resolve_swaps
+from .identityTracking import propose_swaps
+from .propagateFrame import propagate_frame, interpolate_frames, read_interpolation_block, interpolated_points
+from .keypointFlow import track_points, read_gray_frames
+from .updateH5file import update_h5file
+from .saveFrames import save_frame
+from .taskRunner import TaskRunner
+from .timelineWidget import TimelineWidget, array_to_pixmap
+from .thumbnailCache import build_thumbnails, load_thumbnails, nearest_thumbnail
+from .proxyVideo import find_proxy, make_proxy
+from .frameStore import FrameStore
+from .sessionManager import SessionManager, find_sessions
+from .sessionState import ReviewProgress, Autosave
+from .findBadTracking import find_bad_tracking
+from .trackingRules import set_tracking_rules
+from .badFrameIndex import BadFrameIndex
+from .keypointIndex import KeypointGrid
+from .latencyTelemetry import telemetry, span, timed_action
+
+# config.yaml and the files the GUI keeps between sessions are next to the modules
+APP_DIR = Path(__file__).resolve().parent
 
 
 class MovingObject(QGraphicsEllipseItem):
-    def __init__(self, x, y, r, k):
+    def __init__(self, x, y, r, k1, k2):
         super().__init__(0, 0, r, r)
         self.setPos(x, y)
-        if k == 0:
+        # Each item knows which individual and body part it is, so a click never has to search for it
+        self.key = (k1, k2)
+        if k1 == 0:
             self.setBrush(Qt.magenta)
         else:
             self.setBrush(Qt.blue)
@@ -39,21 +56,14 @@ class MovingObject(QGraphicsEllipseItem):
 
     # mouse hover event
     def hoverEnterEvent(self, event):
-        app.instance().setOverrideCursor(Qt.OpenHandCursor)
+        QApplication.setOverrideCursor(Qt.OpenHandCursor)
 
     def hoverLeaveEvent(self, event) -> None:
-        app.instance().restoreOverrideCursor()
+        QApplication.restoreOverrideCursor()
 
     # mouse click event
     def mousePressEvent(self, event) -> None:
-        bpt_loc = [self.pos().x(), self.pos().y()]
-
-        for k1 in gui.body_points_dict.keys():
-            for k2 in gui.body_points_dict[k1].keys():
-                selected_pts = [gui.body_points_dict[k1][k2][0], gui.body_points_dict[k1][k2][1]]
-                if bpt_loc == selected_pts:
-                    self.selected_individual = k1
-                    self.selected_bodypart = k2
+        self.selected_individual, self.selected_bodypart = self.key
 
     def mouseMoveEvent(self, event) -> None:
         orig_cursor_position = event.lastScenePos()
@@ -67,7 +77,12 @@ class MovingObject(QGraphicsEllipseItem):
 
     def mouseReleaseEvent(self, event) -> None:
         self.new_pos = [self.pos().x(), self.pos().y()]
-        gui.body_points_dict[self.selected_individual][self.selected_bodypart] = self.new_pos
+        # The view holds the body points of the window, so the moved point is saved with the next relabel
+        view = self.scene().views()[0]
+        view.body_points[self.key] = self.new_pos
+        view.keypoint_grid.move(self.key, *self.new_pos)
+        if self.scene() is not None and self.scene().mouseGrabberItem() is self:
+            self.ungrabMouse()
 
 
 class GraphicView(QGraphicsView):
@@ -77,10 +92,65 @@ class GraphicView(QGraphicsView):
         self.scene = QGraphicsScene(self)
         self.setScene(self.scene)
 
+        # Items are created once and reused for every frame so the scene does not grow during a session
+        self.image_graphics = None
+        self.keypoint_items = {}
+        self.keypoint_grid = KeypointGrid(np.empty((0, 0, 2)))
+        self.body_points = np.empty((0, 0, 2))
+        self.dot_size = 0
+        self.snap_radius = 0
+
     def get_image_size(self):
         img_size = self.image.shape[:2]
         return img_size
 
+    def set_pixmap(self, pix):
+        if self.image_graphics is None:
+            self.image_graphics = QGraphicsPixmapItem(pix)
+            self.image_graphics.setZValue(-1)
+            self.scene.addItem(self.image_graphics)
+        else:
+            self.image_graphics.setPixmap(pix)
+
+    def mousePressEvent(self, event) -> None:
+        # Pick up the body point nearest to the click, so overlapping or slightly missed points can still be
+        # dragged. The grid is indexed by the items' positions, which are the top-left corners of the dots
+        scene_pos = self.mapToScene(event.pos())
+        offset = self.dot_size / 2
+        key = self.keypoint_grid.nearest(scene_pos.x() - offset, scene_pos.y() - offset, self.snap_radius)
+        if event.button() == Qt.LeftButton and key is not None:
+            moving_object = self.keypoint_items[key]
+            moving_object.selected_individual, moving_object.selected_bodypart = moving_object.key
+            moving_object.grabMouse()
+            event.accept()
+            return
+        super().mousePressEvent(event)
+
+    def update_keypoints(self, body_points, individuals, bodyparts, dot_size, snap_radius):
+        visible = ~np.isnan(body_points).any(axis=-1)
+        self.body_points = body_points
+        self.dot_size = dot_size
+        self.snap_radius = snap_radius
+        self.keypoint_grid = KeypointGrid(body_points, cell_size=max(snap_radius, 1))
+        for k1, k2 in np.ndindex(body_points.shape[:2]):
+            x_v, y_v = body_points[k1, k2]
+            moving_object = self.keypoint_items.get((k1, k2))
+            if moving_object is None:
+                moving_object = MovingObject(0, 0, dot_size, k1, k2)
+                moving_object.setToolTip(f'{individuals[k1]}:{bodyparts[k2]}')
+                self.scene.addItem(moving_object)
+                self.keypoint_items[(k1, k2)] = moving_object
+            # Points that were not tracked in this frame are hidden instead of drawn at a bogus position
+            moving_object.setVisible(bool(visible[k1, k2]))
+            if visible[k1, k2]:
+                moving_object.setPos(x_v, y_v)
+
+    def clear_keypoints(self):
+        for moving_object in self.keypoint_items.values():
+            self.scene.removeItem(moving_object)
+        self.keypoint_items = {}
+        self.keypoint_grid = KeypointGrid(np.empty((0, 0, 2)))
+
 
 class MainGUI(QMainWindow):
     def __init__(self, parent=None, video_name=None, h5_name=None):
@@ -99,19 +169,19 @@ class MainGUI(QMainWindow):
         self.setCentralWidget(self.view)
 
         # Getting screen resolution to rescale image
-        screen = app.primaryScreen()
+        screen = QApplication.primaryScreen()
         screen_res = screen.size()
         self.screen_width = screen_res.width()
         self.screen_height = screen_res.height()
 
         # Using Configuration Files ############################################################################
         self.filters = "Any File (*)"
-        config_path = Path('.') / 'config.yaml'
+        config_path = APP_DIR / 'config.yaml'
 
         with open(config_path, 'r') as fr:
             config = yaml.load(fr, Loader=yaml.FullLoader)
 
-        self.last_frame_path = Path('.') / 'last_video_frame.yaml'
+        self.last_frame_path = APP_DIR / 'last_video_frame.yaml'
 
         if self.last_frame_path.exists():
             with open(self.last_frame_path, 'r') as fr:
@@ -121,12 +191,20 @@ class MainGUI(QMainWindow):
         self.videos_main_path = str(config['videos_main_path'][0])
         self.h5files_main_path = str(config['h5files_path'][0])
         self.save_frame_path = config['frames_path']
+        self.bad_tracking_rules = set_tracking_rules(config.get('bad_tracking'))
 
         # tray = QSystemTrayIcon()
         # tray.setVisible(True)
 
         self.frame_number = 0
+        self.bad_frame_index = None
+        self.tasks = TaskRunner(parent=self)
+        self.frame_converter = FrameConverter()
+        self.sessions = SessionManager()
+        self.progress = None
         self.create_ui()
+        self.refresh_sessions()
+        self.autosave = Autosave(self.checkpoint, self.parameters.autosave_interval)
 
     def create_ui(self) -> None:
         self.create_action()
@@ -139,6 +217,8 @@ class MainGUI(QMainWindow):
         self.file_menu = self.menuBar().addMenu("&File")
         self.file_menu.addAction(self.open_video_action)
         self.file_menu.addAction(self.open_h5_action)
+        self.file_menu.addAction(self.make_proxy_action)
+        self.file_menu.addAction(self.frame_store_action)
 
         # Add this causes the GUI to slow down
         # self.edit_menu = self.menuBar().addMenu("&Edit")
@@ -149,6 +229,11 @@ class MainGUI(QMainWindow):
         # self.edit_menu.addAction(self.mark_start_action)
         # self.edit_menu.addAction(self.mark_end_action)
 
+        self.view_menu = self.menuBar().addMenu("&View")
+        self.view_menu.addAction(self.show_latency_action)
+        self.view_menu.addAction(self.sessions_dock.toggleViewAction())
+        self.view_menu.addAction(self.refresh_sessions_action)
+
         self.help_menu = self.menuBar().addMenu("&Help")
         self.help_menu.addAction(self.help_action)
 
@@ -158,6 +243,9 @@ class MainGUI(QMainWindow):
         self.top_toolbar.addAction(self.open_video_action)
         self.top_toolbar.addAction(self.open_h5_action)
         self.top_toolbar.addSeparator()
+        self.top_toolbar.addAction(self.undo_action)
+        self.top_toolbar.addAction(self.redo_action)
+        self.top_toolbar.addSeparator()
         self.top_toolbar.addWidget(self.frame_number_widget)
 
         self.left_side_toolbar = QToolBar('Frame Toolbar')
@@ -181,20 +269,31 @@ class MainGUI(QMainWindow):
         self.right_side_toolbar.addAction(self.mark_end_action)
         self.right_side_toolbar.addWidget(self.frame_to)
         self.right_side_toolbar.addWidget(self.swap_sequence_button)
+        self.right_side_toolbar.addWidget(self.swap_order)
+        self.right_side_toolbar.addWidget(self.find_swaps_button)
         self.right_side_toolbar.addSeparator()
         self.right_side_toolbar.addWidget(QtWidgets.QLabel('Select Animal'))
         self.right_side_toolbar.addWidget(self.prop_animal)
         self.right_side_toolbar.addWidget(self.prop_forward)
         self.right_side_toolbar.addWidget(self.prop_line)
         self.right_side_toolbar.addWidget(self.prop_backward)
+        self.right_side_toolbar.addWidget(self.track_forward_button)
+        self.right_side_toolbar.addWidget(self.interpolation_method)
+        self.right_side_toolbar.addWidget(self.interpolate_button)
         self.right_side_toolbar.addSeparator()
         self.right_side_toolbar.addWidget(self.done_label_button)
         self.right_side_toolbar.addSeparator()
         self.right_side_toolbar.addWidget(self.save_frame_widget)
         self.right_side_toolbar.addWidget(self.find_bad_tracking_button)
         self.right_side_toolbar.addWidget(self.next_index_button)
+        self.right_side_toolbar.addWidget(self.previous_index_button)
         self.right_side_toolbar.addWidget(self.behavior_index_completion)
 
+        self.timeline_toolbar = QToolBar('Timeline Dock')
+        self.addToolBar(Qt.BottomToolBarArea, self.timeline_toolbar)
+        self.timeline_toolbar.addWidget(self.timeline_widget)
+
+        self.addToolBarBreak(Qt.BottomToolBarArea)
         self.slider_toolbar = QToolBar('Slider Dock')
         self.addToolBar(Qt.BottomToolBarArea, self.slider_toolbar)
         self.slider_toolbar.addWidget(self.frame_slider_widget)
@@ -212,6 +311,32 @@ class MainGUI(QMainWindow):
         self.open_h5_action.setShortcut(QKeySequence("Ctrl+i"))
         self.open_h5_action.triggered.connect(self.open_h5_file)
 
+        # Make a proxy of the video
+        self.make_proxy_action = QAction(QIcon(), ' &Make Proxy Video', self)
+        self.make_proxy_action.triggered.connect(self.event_make_proxy)
+
+        # Store the decoded frames of the video on disk
+        self.frame_store_action = QAction(QIcon(), ' &Store Decoded Frames', self)
+        self.frame_store_action.triggered.connect(self.event_frame_store)
+
+        # List the recordings again, e.g. after new videos were tracked
+        self.refresh_sessions_action = QAction(QIcon(), ' &Refresh Recordings', self)
+        self.refresh_sessions_action.triggered.connect(self.refresh_sessions)
+
+        # Show how long the actions take in the status bar
+        self.show_latency_action = QAction(QIcon(), ' &Show Latency', self)
+        self.show_latency_action.setCheckable(True)
+        self.show_latency_action.toggled.connect(self.event_show_latency)
+
+        # Undo and redo edits
+        self.undo_action = QAction(QIcon.fromTheme("edit-undo"), ' &Undo', self)
+        self.undo_action.setShortcut(QKeySequence.Undo)
+        self.undo_action.triggered.connect(self.event_undo)
+
+        self.redo_action = QAction(QIcon.fromTheme("edit-redo"), ' &Redo', self)
+        self.redo_action.setShortcut(QKeySequence.Redo)
+        self.redo_action.triggered.connect(self.event_redo)
+
         # Help functions
         self.help_action = QAction(QIcon(), '&Show Shortcuts',
                                    self)
@@ -284,6 +409,14 @@ class MainGUI(QMainWindow):
         self.swap_sequence_button.clicked.connect(self.event_swap_sequence)
         self.swap_sequence_button.setShortcut(QKeySequence("Ctrl+/"))
 
+        self.swap_order = QtWidgets.QLineEdit()
+        self.swap_order.setPlaceholderText('Order e.g. 1,0')
+        self.swap_order.returnPressed.connect(self.event_disable_lineedit)
+
+        self.find_swaps_button = QtWidgets.QPushButton('Find Swaps')
+        self.find_swaps_button.setFont(font)
+        self.find_swaps_button.clicked.connect(self.event_find_swaps)
+
         self.prop_animal = QtWidgets.QComboBox()
 
         self.prop_forward = QtWidgets.QPushButton('Propagate Forward')
@@ -304,6 +437,19 @@ class MainGUI(QMainWindow):
         self.prop_backward.clicked.connect(self.event_propagate_backward)
         self.prop_backward.setShortcut(QKeySequence("Ctrl+["))
 
+        self.track_forward_button = QtWidgets.QPushButton('Track Forward')
+        self.track_forward_button.setFont(font)
+        self.track_forward_button.clicked.connect(self.event_track_forward)
+        self.track_forward_button.setShortcut(QKeySequence("Ctrl+Shift+]"))
+
+        self.interpolation_method = QtWidgets.QComboBox()
+        self.interpolation_method.addItems(['linear', 'cubic', 'optical_flow'])
+
+        self.interpolate_button = QtWidgets.QPushButton('Interpolate From/To')
+        self.interpolate_button.setFont(font)
+        self.interpolate_button.clicked.connect(self.event_interpolate)
+        self.interpolate_button.setShortcut(QKeySequence("Ctrl+Shift+i"))
+
         self.done_label_button = QtWidgets.QPushButton('Done Relabeling')
         self.done_label_button.setFont(font)
         # self.done_label_button.setFixedWidth(150)
@@ -329,39 +475,89 @@ class MainGUI(QMainWindow):
         self.next_index_button.clicked.connect(self.event_move_to_index)
         self.next_index_button.setShortcut(QKeySequence("Ctrl+b"))
 
+        self.previous_index_button = QtWidgets.QPushButton('Previous Bad Tracking')
+        self.previous_index_button.setFont(font)
+        self.previous_index_button.clicked.connect(self.event_move_to_previous_index)
+        self.previous_index_button.setShortcut(QKeySequence("Ctrl+Shift+b"))
+
         self.behavior_index_completion = QtWidgets.QLabel()
         font = self.behavior_index_completion.font()
         # font.setPointSize(8)
         self.behavior_index_completion.setFont(font)
 
+        # Progress of the operations running in the background
+        self.task_label = QtWidgets.QLabel()
+        self.task_progress = QtWidgets.QProgressBar()
+        self.task_progress.setFixedWidth(200)
+        self.cancel_task_button = QtWidgets.QPushButton('Cancel')
+        self.cancel_task_button.clicked.connect(self.tasks.cancel_all)
+        for widget in (self.task_label, self.task_progress, self.cancel_task_button):
+            self.statusBar().addPermanentWidget(widget)
+            widget.setVisible(False)
+        # The latency of the last action and its stages, updated once a second while it is shown
+        self.latency_label = QtWidgets.QLabel()
+        self.statusBar().addWidget(self.latency_label)
+        self.latency_label.setVisible(False)
+        # The share of the frames of the video that have been looked at, kept across sessions
+        self.review_label = QtWidgets.QLabel()
+        self.statusBar().addPermanentWidget(self.review_label)
+        self.latency_timer = QTimer(self)
+        self.latency_timer.setInterval(1000)
+        self.latency_timer.timeout.connect(self.update_latency_label)
+
+        self.tasks.started.connect(self.event_task_started)
+        self.tasks.progress.connect(self.event_task_progress)
+        self.tasks.finished.connect(self.event_task_finished)
+
         self.frame_slider_widget = QtWidgets.QSlider(Qt.Horizontal)
         self.frame_slider_widget.setRange(0, 100)
         self.frame_slider_widget.setSingleStep(1)
-        self.frame_slider_widget.valueChanged[int].connect(self.event_frame_slider)
+        self.frame_slider_widget.valueChanged[int].connect(self.event_slider_moved)
+
+        # While the slider is dragged only the cached thumbnails are shown. The full frame is decoded once the slider
+        # has stopped moving
+        self.slider_timer = QTimer(self)
+        self.slider_timer.setSingleShot(True)
+        self.slider_timer.setInterval(150)
+        self.slider_timer.timeout.connect(self.event_frame_slider)
+
+        # The recordings under the video and H5 folders, to switch between them without the file dialogs
+        self.sessions_list = QtWidgets.QListWidget()
+        self.sessions_list.itemActivated.connect(self.event_session_selected)
+        self.sessions_dock = QtWidgets.QDockWidget('Recordings', self)
+        self.sessions_dock.setWidget(self.sessions_list)
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.sessions_dock)
+
+        self.timeline_widget = TimelineWidget()
+        self.timeline_widget.frame_selected.connect(self.frame_slider_widget.setValue)
+        self.thumbnail_frames = None
+        self.thumbnails = None
 
     def show_image(self):
-        self.gui_height = int(self.image.shape[1] * self.scale_factor * 1.1)
-        self.gui_width = int(self.image.shape[0] * self.scale_factor * 1.4)
-        self.image = process_frame(self.image, self.screen_height, self.screen_width)
-        self.pix = qt_image_process(self.image)
-        self.image_graphics = QGraphicsPixmapItem(self.pix)
-        self.view.scene.addItem(self.image_graphics)
+        self.gui_height = int(self.frame_provider.width * self.scale_factor * 1.1)
+        self.gui_width = int(self.frame_provider.height * self.scale_factor * 1.4)
+        with span('to_pixmap'):
+            self.pix = self.frame_converter.to_pixmap(self.image)
+        with span('set_pixmap'):
+            self.view.set_pixmap(self.pix)
+        if self.progress is not None:
+            self.progress.update(self.frame_number, self.h5_name)
+            self.review_label.setText(f'Reviewed: {self.progress.reviewed_fraction:.1%}')
+        self.timeline_widget.set_current_frame(self.frame_number)
 
     def open_vid_file(self) -> None:
         try:
+            self.remember_video_state()
             self.video_name, self.filter_name = QFileDialog.getOpenFileName(self, "Open file",
                                                                             self.videos_main_path,
                                                                             self.filters
                                                                             )
             print(self.video_name)
-            self.cap = cv2.VideoCapture(self.video_name)
-            self.length = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) - 1
-            self.indexlength = int(np.ceil(np.log10(self.length)))
-            self.frame_slider_widget.setRange(0, self.length)
-            ret, self.image = self.cap.read()
-            self.show_image()
-            self.setGeometry(200, 0, self.gui_width, self.gui_height)
-            self.frame_number_widget.setText(f"Frames: {self.frame_number} / {self.length}")
+            self.h5_name = None
+            self.view.clear_keypoints()
+            self.load_video()
+            if self.paired_h5_name():
+                self.load_session_h5(self.video_name, self.paired_h5_name())
             if self.last_frame_path.exists():
                 if self.video_name in self.last_frame_data.keys():
                     self.move_to_last_labeled_frame()
@@ -375,15 +571,206 @@ class MainGUI(QMainWindow):
         except ValueError:
             QtWidgets.QMessageBox.warning(self, 'Error', 'Expects a video file with a format of avi or mp4')
 
+    # Show the video from the session manager. A video that is still open from earlier is shown straight away, at the
+    # frame it was left at
+    def load_video(self) -> None:
+        state = self.sessions.state(self.video_name)
+        self.frame_provider = self.sessions.frame_provider(self.video_name, self.screen_height, self.screen_width,
+                                                           proxy_name=find_proxy(self.video_name))
+        self.length = self.frame_provider.length
+        if state.progress is None:
+            # The first time the video is opened in this session it continues where the last session left it
+            state.progress = ReviewProgress(self.video_name, self.length + 1)
+            state.frame_number = state.progress.frame_number
+        self.progress = state.progress
+        self.indexlength = int(np.ceil(np.log10(self.length)))
+        self.frame_slider_widget.setRange(0, self.length)
+        self.timeline_widget.set_length(self.length)
+        self.load_timeline_thumbnails()
+        if self.parameters.frame_store and self.frame_provider.frame_store is None:
+            self.load_frame_store()
+        self.frame_number = min(state.frame_number, self.length)
+        self.image = self.frame_provider.get_frame(self.frame_number)
+        self.show_image()
+        self.setGeometry(200, 0, self.gui_width, self.gui_height)
+        self.frame_number_widget.setText(f"Frames: {self.frame_number} / {self.length}")
+        self.goto_frame.setText(str(self.frame_number))
+        self.set_slider_value(self.frame_number)
+
+    # The H5 file the current video was last reviewed with, if it still exists
+    def paired_h5_name(self):
+        if self.progress is None or not self.progress.h5_name or not Path(self.progress.h5_name).is_file():
+            return None
+        return self.progress.h5_name
+
+    # Keep where the current video was left, to come back to it
+    def remember_video_state(self) -> None:
+        if not self.video_name:
+            return
+        state = self.sessions.state(self.video_name)
+        state.frame_number = self.frame_number
+        state.h5_name = self.h5_name
+        state.bad_frame_index = self.bad_frame_index
+
+    # Runs on the autosave thread. The edits are saved to the journal of their H5 file as they are made, so only the
+    # review progress of the videos is left to save
+    def checkpoint(self) -> None:
+        for state in self.sessions.states().values():
+            if state.progress is not None:
+                state.progress.save()
+
+    # List the recordings under the video and H5 folders in the background
+    def refresh_sessions(self) -> None:
+        videos_path, h5_path = self.videos_main_path, self.h5files_main_path
+
+        def sessions_found(sessions):
+            self.sessions_list.clear()
+            for video_name, h5_name in sessions:
+                item = QtWidgets.QListWidgetItem(Path(video_name).name + ('' if h5_name else ' (no H5 file)'))
+                item.setToolTip(f'{video_name}\n{h5_name or ""}')
+                item.setData(Qt.UserRole, (video_name, h5_name))
+                self.sessions_list.addItem(item)
+
+        self.tasks.submit(lambda task: find_sessions(videos_path, h5_path), sessions_found, self.task_failed,
+                          'Finding recordings')
+
+    def event_session_selected(self, item) -> None:
+        video_name, h5_name = item.data(Qt.UserRole)
+        self.open_session(video_name, h5_name)
+
+    # Switch to another recording. The H5 file is read on the edit thread unless it is still in memory
+    @timed_action('switch_recording')
+    def open_session(self, video_name, h5_name) -> None:
+        try:
+            self.remember_video_state()
+            self.video_name = video_name
+            self.h5_name = None
+            self.view.clear_keypoints()
+            self.load_video()
+        except (AttributeError, ValueError):
+            QtWidgets.QMessageBox.warning(self, 'Error', f'Unable to load the Video \n{video_name}')
+            return
+        # The H5 file the video was reviewed with before is used over the one found by its name
+        h5_name = self.paired_h5_name() or h5_name
+        if h5_name is None:
+            return
+        self.load_session_h5(video_name, h5_name)
+
+    # Show the H5 file of a video. It is read on the edit thread unless it is still in memory
+    def load_session_h5(self, video_name, h5_name) -> None:
+        state = self.sessions.state(video_name)
+
+        def loaded(pose_store):
+            if video_name != self.video_name:
+                return
+            self.h5_name = h5_name
+            self.h5_file_loaded(pose_store)
+            if state.h5_name == h5_name and state.bad_frame_index is not None:
+                self.bad_frame_index = state.bad_frame_index
+                self.update_timeline_heat()
+
+        if self.sessions.is_open(h5_name=h5_name):
+            loaded(self.sessions.pose_store(h5_name))
+            return
+        old_pose_store = getattr(self, 'pose_store', None)
+
+        def load(task):
+            if old_pose_store is not None:
+                old_pose_store.flush()
+            return self.sessions.pose_store(h5_name)
+
+        self.tasks.submit(load, loaded, self.task_failed, 'Loading H5 file', edit=True)
+
+    # The thumbnails are made once per video in the background and cached next to it
+    def load_timeline_thumbnails(self) -> None:
+        video_name = self.video_name
+        state = self.sessions.state(video_name)
+        self.thumbnail_frames, self.thumbnails = None, None
+        self.timeline_widget.set_thumbnails(None, None)
+
+        def thumbnails_loaded(result):
+            if result is not None:
+                state.thumbnails = result
+            if result is not None and video_name == self.video_name:
+                self.thumbnail_frames, self.thumbnails = result
+                self.timeline_widget.set_thumbnails(*result)
+
+        if state.thumbnails is not None:
+            thumbnails_loaded(state.thumbnails)
+            return
+
+        cached = load_thumbnails(video_name)
+        if cached is not None:
+            thumbnails_loaded(cached)
+            return
+        proxy_name = find_proxy(video_name)
+        self.tasks.submit(lambda task: build_thumbnails(video_name, progress=task.report, stop_event=task.cancel_event,
+                                                        source=proxy_name),
+                          thumbnails_loaded, self.task_failed, 'Making thumbnails')
+
+    # Make a scaled down proxy of the video and switch to it for navigation once it is done
+    def event_make_proxy(self) -> None:
+        try:
+            video_name = self.video_name
+            if not video_name:
+                raise AttributeError
+
+            def proxy_made(proxy_name):
+                if proxy_name is None or video_name != self.video_name:
+                    return
+                frame_provider = FrameProvider(video_name, self.screen_height, self.screen_width,
+                                               proxy_name=proxy_name)
+                frame_provider.frame_store = self.frame_provider.frame_store
+                self.sessions.replace_frame_provider(video_name, frame_provider)
+                self.frame_provider = frame_provider
+                self.image = self.frame_provider.get_frame(self.frame_number)
+                self.show_image()
+
+            self.tasks.submit(lambda task: make_proxy(video_name, progress=task.report, stop_event=task.cancel_event),
+                              proxy_made, self.task_failed, 'Making proxy video')
+        except AttributeError:
+            QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
+
+    # Keep the decoded frames of the video on disk, so jumping to any frame no longer needs a seek and a decode.
+    # The store is filled in the background and is used for the frames it already holds
+    def load_frame_store(self) -> None:
+        video_name = self.video_name
+        frame_provider = self.frame_provider
+        try:
+            frame_store = FrameStore(video_name, frame_provider.length + 1, frame_provider.display_dim)
+        except OSError as error:
+            QtWidgets.QMessageBox.warning(self, 'Error', f'Unable to make the frame store \n{error}')
+            return
+        frame_provider.frame_store = frame_store
+        if not frame_store.complete:
+            proxy_name = find_proxy(video_name)
+            self.tasks.submit(lambda task: frame_store.fill(self.screen_height, self.screen_width, source=proxy_name,
+                                                            progress=task.report, stop_event=task.cancel_event),
+                              None, self.task_failed, 'Storing decoded frames')
+
+    def event_frame_store(self) -> None:
+        if getattr(self, 'frame_provider', None) is None:
+            QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
+            return
+        if self.frame_provider.frame_store is None:
+            self.load_frame_store()
+
+    # Show the heatmap of the bad tracking scores, or of the bad frames when the scores are not known
+    def update_timeline_heat(self, scores=None) -> None:
+        if scores:
+            flag_scores = [scores[name] for name in self.bad_tracking_rules.flag_rules if name in scores]
+            self.timeline_widget.set_heat(np.max(flag_scores, axis=0) if flag_scores else None)
+        elif self.bad_frame_index is not None:
+            heat = np.zeros(self.pose_store.n_frames)
+            heat[self.bad_frame_index.frames[self.bad_frame_index.frames < len(heat)]] = 1
+            self.timeline_widget.set_heat(heat)
+
     def img_plot_tracked_points(self):
-        self.body_points_dict = plot_tracked_points(self.h5, self.scale_factor, self.frame_number)
-        for k, k1 in enumerate(self.body_points_dict.keys()):
-            for k2 in self.body_points_dict[k1].keys():
-                x_v = self.body_points_dict[k1][k2][0]
-                y_v = self.body_points_dict[k1][k2][1]
-                self.moving_object = MovingObject(x_v, y_v, self.parameters.dot_size, k)
-                self.moving_object.setToolTip(f'{k1}:{k2}')
-                self.view.scene.addItem(self.moving_object)
+        with span('plot_tracked_points'):
+            self.body_points = plot_tracked_points(self.pose_store, self.scale_factor, self.frame_number)
+        with span('update_keypoints'):
+            self.view.update_keypoints(self.body_points, self.pose_store.individuals, self.pose_store.bodyparts,
+                                       self.parameters.dot_size, self.parameters.snap_radius)
 
     def move_to_last_labeled_frame(self) -> None:
         last_frame_output = QtWidgets.QMessageBox.question(self, 'Last Frame',
@@ -393,23 +780,42 @@ class MainGUI(QMainWindow):
                                                            defaultButton=QtWidgets.QMessageBox.StandardButton.Yes)
         if last_frame_output == QtWidgets.QMessageBox.StandardButton.Yes:
             self.frame_number = self.last_frame_data[self.video_name]
-            self.cap.set(1, self.frame_number)
-            ret, self.image = self.cap.read()
+            self.image = self.frame_provider.get_frame(self.frame_number)
             self.show_image()
             self.frame_number_widget.setText(f"Frames: {self.frame_number} / {self.length}")
-            self.frame_slider_widget.setValue(self.frame_number)
+            self.set_slider_value(self.frame_number)
 
     def open_h5_file(self) -> None:
         try:
             self.h5_name, self.filter_name = QFileDialog.getOpenFileName(self, "Open file",
                                                                          self.h5files_main_path,
                                                                          "*.h5")
-            self.h5 = pd.read_hdf(self.h5_name)
+            old_pose_store = getattr(self, 'pose_store', None)
+            h5_name = self.h5_name
+
+            # Loaded on the edit thread so the edits of the previous file are written first
+            def load(task):
+                if old_pose_store is not None:
+                    old_pose_store.flush()
+                return self.sessions.pose_store(h5_name)
+
+            self.tasks.submit(load, self.h5_file_loaded, self.task_failed, 'Loading H5 file', edit=True)
+
+        except AttributeError:
+            QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
+
+    def h5_file_loaded(self, pose_store) -> None:
+        try:
+            self.pose_store = pose_store
+            self.bad_frame_index = None
+            self.timeline_widget.set_heat(None)
+            self.view.clear_keypoints()
             self.img_plot_tracked_points()
 
             # Add animals to propagate list
-            self.animals_identity = list(self.body_points_dict.keys())
+            self.animals_identity = list(self.pose_store.individuals)
             self.animals_identity.append('both')
+            self.prop_animal.clear()
             self.prop_animal.addItems(self.animals_identity)
             self.prop_animal.setFixedWidth(100)
             self.prop_animal.setCurrentText(self.animals_identity[-1])
@@ -417,6 +823,56 @@ class MainGUI(QMainWindow):
         except AttributeError:
             QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
 
+    # Run an edit of the pose data on the edit thread and redraw the points once it is applied. The time of the whole
+    # action, from the click to the redrawn points, is recorded along with the time of the edit itself
+    def run_edit(self, edit, description) -> None:
+        pose_store = self.pose_store
+        start = time.perf_counter()
+
+        def apply(task):
+            with span(f'edit: {description}'):
+                result = edit(pose_store)
+            pose_store.flush(background=True)
+            return result
+
+        def applied(result):
+            if pose_store is getattr(self, 'pose_store', None):
+                self.img_plot_tracked_points()
+            telemetry.record(f'action: {description}', (time.perf_counter() - start) * 1000)
+
+        self.tasks.submit(apply, applied, self.task_failed, description, edit=True)
+
+    def event_show_latency(self, show) -> None:
+        self.latency_label.setVisible(show)
+        if show:
+            self.update_latency_label()
+            self.latency_timer.start()
+        else:
+            self.latency_timer.stop()
+
+    def update_latency_label(self) -> None:
+        self.latency_label.setText(telemetry.status_text(['get_frame', 'cap.read', 'process_frame', 'to_pixmap',
+                                                          'plot_tracked_points', 'update_keypoints']))
+
+    def task_failed(self, error) -> None:
+        QtWidgets.QMessageBox.warning(self, 'Error', str(error))
+
+    def event_task_started(self, task) -> None:
+        self.task_label.setText(task.description)
+        self.task_progress.setRange(0, 0)
+        for widget in (self.task_label, self.task_progress, self.cancel_task_button):
+            widget.setVisible(True)
+
+    def event_task_progress(self, task, value, maximum) -> None:
+        self.task_label.setText(task.description)
+        self.task_progress.setRange(0, maximum)
+        self.task_progress.setValue(value)
+
+    def event_task_finished(self, task, result, error) -> None:
+        if not self.tasks.active:
+            for widget in (self.task_label, self.task_progress, self.cancel_task_button):
+                widget.setVisible(False)
+
     def show_shortcuts(self) -> None:
         QtWidgets.QMessageBox.about(self, "Show Shortcuts",
                                     "Next Frame\t\t --> Right Arrow \n"
@@ -429,10 +885,17 @@ class MainGUI(QMainWindow):
                                     "Swap Sequence\t --> Ctrl + / \n"
                                     "Propagate Forward\t --> Ctrl + ] \n"
                                     "Propagate Backward\t --> Ctrl + [ \n"
+                                    "Interpolate From/To\t --> Ctrl + Shift + i \n"
+                                    "Track Forward\t --> Ctrl + Shift + ] \n"
                                     "Relabel\t\t --> Ctrl + l \n"
                                     "Done Labeling\t --> Ctrl + ; \n"
+                                    "Undo\t\t --> Ctrl + z \n"
+                                    "Redo\t\t --> Ctrl + Shift + z \n"
+                                    "Next Bad Tracking\t --> Ctrl + b \n"
+                                    "Previous Bad Tracking\t --> Ctrl + Shift + b \n"
                                     )
 
+    @timed_action('go_to_frame')
     def event_go_to_frame(self) -> None:
         try:
             self.goto_num = self.goto_frame.text()
@@ -443,12 +906,11 @@ class MainGUI(QMainWindow):
             except ValueError:
                 QtWidgets.QMessageBox.warning(self, 'ValueError', 'invalid number entered')
             self.goto_frame.setText(str(self.frame_number))
-            self.frame_slider_widget.setValue(self.frame_number)
+            self.set_slider_value(self.frame_number)
             if self.video_name:
                 if self.frame_number > self.length:
                     self.frame_number = self.length
-                self.cap.set(1, self.frame_number)
-                ret, self.image = self.cap.read()
+                self.image = self.frame_provider.get_frame(self.frame_number)
                 if self.h5_name:
                     self.show_image()
                     self.img_plot_tracked_points()
@@ -459,14 +921,25 @@ class MainGUI(QMainWindow):
         except AttributeError:
             QtWidgets.QMessageBox.warning(self, 'Error', 'Frame does not exits')
 
+    # Show the closest thumbnail while the slider is moving and decode the frame once it stops
+    @timed_action('slider_preview')
+    def event_slider_moved(self, frame_number) -> None:
+        self.frame_number_widget.setText(f"Frames: {frame_number} / {getattr(self, 'length', 0)}")
+        self.timeline_widget.set_current_frame(frame_number)
+        if self.thumbnails is not None and getattr(self, 'image', None) is not None:
+            thumbnail = self.thumbnails[nearest_thumbnail(self.thumbnail_frames, frame_number)]
+            preview = cv2.resize(thumbnail, (self.image.shape[1], self.image.shape[0]))
+            self.view.set_pixmap(array_to_pixmap(preview[..., ::-1]))
+        self.slider_timer.start()
+
     # Sliding through the video
+    @timed_action('slider')
     def event_frame_slider(self) -> None:
         try:
             self.frame_number = int(self.frame_slider_widget.value())
             # self.goto_frame.setText(str(self.frame_number))
             if self.video_name:
-                self.cap.set(1, self.frame_number)
-                ret, self.image = self.cap.read()
+                self.image = self.frame_provider.get_frame(self.frame_number)
 
                 if self.h5_name:
                     self.show_image()
@@ -481,16 +954,16 @@ class MainGUI(QMainWindow):
                                                          'Reload it again')
 
     # Moving forward through the video one frame at a time.
+    @timed_action('next_frame')
     def event_next_frame(self) -> None:
         try:
             self.frame_number += 1
             if self.frame_number > self.length:
                 self.frame_number = self.length
             self.goto_frame.setText(str(self.frame_number))
-            self.frame_slider_widget.setValue(self.frame_number)
+            self.set_slider_value(self.frame_number)
             if self.video_name:
-                self.cap.set(1, self.frame_number)
-                ret, self.image = self.cap.read()
+                self.image = self.frame_provider.get_frame(self.frame_number)
                 if self.h5_name:
                     self.show_image()
                     self.img_plot_tracked_points()
@@ -502,16 +975,16 @@ class MainGUI(QMainWindow):
             QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
 
     # Moving backward through the video one frame at a time.
+    @timed_action('previous_frame')
     def event_previous_frame(self) -> None:
         try:
             self.frame_number -= 1
             if self.frame_number < 0:
                 self.frame_number = 0
             self.goto_frame.setText(str(self.frame_number))
-            self.frame_slider_widget.setValue(self.frame_number)
+            self.set_slider_value(self.frame_number)
             if self.video_name:
-                self.cap.set(1, self.frame_number)
-                ret, self.image = self.cap.read()
+                self.image = self.frame_provider.get_frame(self.frame_number)
                 if self.h5_name:
                     self.show_image()
                     self.img_plot_tracked_points()
@@ -523,6 +996,7 @@ class MainGUI(QMainWindow):
             QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
 
     # Jump forward a set number of frames
+    @timed_action('jump_forward')
     def event_jump_forward(self) -> None:
         try:
             self.val_num = self.jump_number.text()
@@ -536,10 +1010,9 @@ class MainGUI(QMainWindow):
             if self.frame_number > self.length:
                 self.frame_number = self.length
             self.goto_frame.setText(str(self.frame_number))
-            self.frame_slider_widget.setValue(self.frame_number)
+            self.set_slider_value(self.frame_number)
             if self.video_name:
-                self.cap.set(1, self.frame_number)
-                ret, self.image = self.cap.read()
+                self.image = self.frame_provider.get_frame(self.frame_number)
                 if self.h5_name:
                     self.show_image()
                     self.img_plot_tracked_points()
@@ -551,6 +1024,7 @@ class MainGUI(QMainWindow):
             QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
 
     # Jump backward a set number of frames
+    @timed_action('jump_backward')
     def event_jump_backward(self) -> None:
         try:
             self.val_num = self.jump_number.text()
@@ -564,10 +1038,9 @@ class MainGUI(QMainWindow):
             if self.frame_number < 0:
                 self.frame_number = 0
             self.goto_frame.setText(str(self.frame_number))
-            self.frame_slider_widget.setValue(self.frame_number)
+            self.set_slider_value(self.frame_number)
             if self.video_name:
-                self.cap.set(1, self.frame_number)
-                ret, self.image = self.cap.read()
+                self.image = self.frame_provider.get_frame(self.frame_number)
                 if self.h5_name:
                     self.show_image()
                     self.img_plot_tracked_points()
@@ -590,15 +1063,14 @@ class MainGUI(QMainWindow):
     def event_swap_frame(self) -> None:
         try:
             if self.h5_name:
-                swap_labels(self.h5, self.frame_number, self.h5_name)
-                self.h5 = pd.read_hdf(self.h5_name)
-                self.show_image()
-                self.img_plot_tracked_points()
+                frame_number, order = self.frame_number, self.get_swap_order()
+                self.run_edit(lambda pose_store: swap_labels(pose_store, frame_number, order), 'Swapping labels')
         except AttributeError:
             QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(self, 'ValueError', str(error))
 
     # Swap the labels for mis-tracked points on the animals for a sequence of frames.
-    # Only works for two tracked animals.
     def event_swap_sequence(self) -> None:
         try:
             if self.h5_name:
@@ -611,13 +1083,46 @@ class MainGUI(QMainWindow):
                     self.to_frame_number = self.to_frame_number
                 else:
                     self.to_frame_number += 1
-                swap_label_sequences(self.h5, self.from_frame_number, self.to_frame_number, self.h5_name)
-                self.h5 = pd.read_hdf(self.h5_name)
-                self.show_image()
-                self.img_plot_tracked_points()
+                from_frame, to_frame, order = self.from_frame_number, self.to_frame_number, self.get_swap_order()
+                self.run_edit(lambda pose_store: swap_label_sequences(pose_store, from_frame, to_frame, order),
+                              'Swapping labels')
+        except AttributeError:
+            QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(self, 'ValueError', str(error))
+
+    # The order to swap the labels to, e.g. "1,0,3,2". Empty swaps the labels of two animals
+    def get_swap_order(self):
+        order = self.swap_order.text().strip()
+        if order == '':
+            return None
+        return [int(label) for label in order.split(',')]
+
+    # Find the frames where the identities of the animals are swapped and fix them all at once
+    def event_find_swaps(self) -> None:
+        try:
+            if self.h5_name:
+                pose_store = self.pose_store
+                # A copy is searched, as the points can be edited on the edit thread meanwhile
+                self.tasks.submit(lambda task: propose_swaps(pose_store.snapshot()), self.swaps_found,
+                                  self.task_failed, 'Finding swapped labels')
         except AttributeError:
             QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
 
+    def swaps_found(self, segments) -> None:
+        if not segments:
+            QtWidgets.QMessageBox.information(self, 'Find Swaps', 'No swapped labels found')
+            return
+        n_frames = sum(end - start + 1 for start, end, _ in segments)
+        fix_output = QtWidgets.QMessageBox.question(self, 'Find Swaps',
+                                                    f'Found {len(segments)} sequences ({n_frames} frames) '
+                                                    f'with swapped labels. Fix them all?',
+                                                    buttons=(QtWidgets.QMessageBox.StandardButton.Yes |
+                                                             QtWidgets.QMessageBox.StandardButton.No),
+                                                    defaultButton=QtWidgets.QMessageBox.StandardButton.Yes)
+        if fix_output == QtWidgets.QMessageBox.StandardButton.Yes:
+            self.run_edit(lambda pose_store: resolve_swaps(pose_store, segments), 'Fixing swapped labels')
+
     # Propagate rightly tracked body points from the previous image to the current one
     def event_propagate_forward(self) -> None:
         try:
@@ -632,11 +1137,9 @@ class MainGUI(QMainWindow):
                     QtWidgets.QMessageBox.warning(self, 'ValueError', 'invalid number entered - integer required')
                 if steps == 1:
                     steps += 1
-                animal_ident = self.prop_animal.currentText()
-                propagate_frame(self.h5, self.frame_number, self.h5_name, 'forward', steps, animal_ident)
-                self.h5 = pd.read_hdf(self.h5_name)
-                self.show_image()
-                self.img_plot_tracked_points()
+                animal_ident, frame_number = self.prop_animal.currentText(), self.frame_number
+                self.run_edit(lambda pose_store: propagate_frame(pose_store, frame_number, 'forward', steps,
+                                                                 animal_ident), 'Propagating forward')
         except AttributeError:
             QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
 
@@ -652,67 +1155,199 @@ class MainGUI(QMainWindow):
                     steps = int(steps)
                 except ValueError:
                     QtWidgets.QMessageBox.warning(self, 'ValueError', 'invalid number entered - integer required')
+                animal_ident, frame_number = self.prop_animal.currentText(), self.frame_number
+                self.run_edit(lambda pose_store: propagate_frame(pose_store, frame_number, 'backward', steps,
+                                                                 animal_ident), 'Propagating backward')
+        except AttributeError:
+            QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
+
+    # Carry the corrected body points of the current frame forward with optical flow. The frames are decoded and
+    # tracked in a background thread and the result is written as a single edit when it is done
+    def event_track_forward(self) -> None:
+        try:
+            if self.h5_name and self.video_name:
+                steps = self.prop_line.text()
+                if steps == '':
+                    steps = '1'
+                    self.prop_line.setText(steps)
+                try:
+                    steps = int(steps)
+                except ValueError:
+                    QtWidgets.QMessageBox.warning(self, 'ValueError', 'invalid number entered - integer required')
+                    return
                 animal_ident = self.prop_animal.currentText()
-                propagate_frame(self.h5, self.frame_number, self.h5_name, 'backward', steps, animal_ident)
-                self.h5 = pd.read_hdf(self.h5_name)
-                self.show_image()
-                self.img_plot_tracked_points()
+                pose_store, frame_number, video_name = self.pose_store, self.frame_number, self.video_name
+
+                # The starting points are read on the edit thread, so the edits made before are tracked as well
+                def read_points(task):
+                    individuals = pose_store.individual_indices(animal_ident)
+                    return individuals, pose_store.coords[frame_number, individuals]
+
+                def points_read(result):
+                    individuals, points = result
+
+                    def track(task):
+                        return track_points(video_name, frame_number, points, steps, stop_event=task.cancel_event)
+
+                    def tracked(tracks):
+                        if not len(tracks) or pose_store is not getattr(self, 'pose_store', None):
+                            return
+                        start, stop = frame_number + 1, frame_number + 1 + len(tracks)
+
+                        # Points that were lost keep their positions
+                        def apply(store):
+                            values = np.where(np.isnan(tracks), store.coords[start:stop, individuals], tracks)
+                            store.apply_edit(start, stop, individuals, values)
+
+                        self.run_edit(apply, 'Applying tracked points')
+                        self.behavior_index_completion.setText(f'Tracked {len(tracks)} frames')
+
+                    self.tasks.submit(track, tracked, self.task_failed, 'Tracking forward')
+
+                self.tasks.submit(read_points, points_read, self.task_failed, 'Reading the points', edit=True)
+        except AttributeError:
+            QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
+
+    # Replace the body points between the From and To frames by interpolating between them
+    def event_interpolate(self) -> None:
+        try:
+            if self.h5_name:
+                try:
+                    from_frame_number = int(self.frame_from.text())
+                    to_frame_number = int(self.frame_to.text())
+                except ValueError:
+                    QtWidgets.QMessageBox.warning(self, 'ValueError', 'invalid number entered - integer required')
+                    return
+                method = self.interpolation_method.currentText()
+                animal_ident = self.prop_animal.currentText()
+                if method != 'optical_flow':
+                    self.run_edit(lambda store: interpolate_frames(store, from_frame_number, to_frame_number,
+                                                                   animal_ident, method), 'Interpolating')
+                    return
+                if to_frame_number - from_frame_number < 2:
+                    return
+                pose_store, video_name = self.pose_store, self.video_name
+                # The flow is followed on grayscale frames at the size they are shown, which are kept for the
+                # backward pass
+                scale = self.frame_provider.display_dim[0] / self.frame_provider.width
+
+                # The points are read on the edit thread, after the edits made before, and the frames are tracked
+                # in the background. Only the tracked points are then applied as an edit
+                def read_block(task):
+                    return read_interpolation_block(pose_store, from_frame_number, to_frame_number, animal_ident)
+
+                def block_read(result):
+                    individuals, block, before, after = result
+
+                    def track(task):
+                        images = read_gray_frames(video_name, from_frame_number, len(block), scale,
+                                                  stop_event=task.cancel_event)
+                        return interpolated_points(block, before, after, method, images, scale)
+
+                    def tracked(values):
+                        if pose_store is not getattr(self, 'pose_store', None):
+                            return
+                        self.run_edit(lambda store: store.apply_edit(from_frame_number + 1, to_frame_number,
+                                                                     individuals, values), 'Interpolating')
+
+                    self.tasks.submit(track, tracked, self.task_failed, 'Interpolating with optical flow')
+
+                self.tasks.submit(read_block, block_read, self.task_failed, 'Reading the points', edit=True)
         except AttributeError:
             QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
 
     def event_done_labeling(self) -> None:
         try:
-            self.cap.set(1, self.frame_number)
-            ret, self.image = self.cap.read()
-            new_points = gui.body_points_dict
-            update_h5file(new_points, self.h5, self.frame_number, self.h5_name, self.scale_factor)
-            # print(new_points)
-            self.h5 = pd.read_hdf(self.h5_name)
-            self.show_image()
-            self.img_plot_tracked_points()
+            new_points, frame_number = self.body_points.copy(), self.frame_number
+            self.run_edit(lambda pose_store: update_h5file(new_points, pose_store, frame_number, self.scale_factor),
+                          'Saving relabeled points')
         except AttributeError:
             QtWidgets.QMessageBox.warning(self, 'Error', 'Load the Video first')
 
+    def event_undo(self) -> None:
+        try:
+            self.run_edit(lambda pose_store: pose_store.undo(), 'Undoing')
+        except AttributeError:
+            QtWidgets.QMessageBox.warning(self, 'Error', 'Load the H5 file first')
+
+    def event_redo(self) -> None:
+        try:
+            self.run_edit(lambda pose_store: pose_store.redo(), 'Redoing')
+        except AttributeError:
+            QtWidgets.QMessageBox.warning(self, 'Error', 'Load the H5 file first')
+
     def event_save_frame(self) -> None:
         output_path = f'{self.save_frame_path[0]}{Path(self.video_name).stem}'
         if not os.path.exists(output_path):
             os.makedirs(output_path)
-        self.cap.set(1, self.frame_number)
-        ret, image = self.cap.read()
+        image = self.frame_provider.read_raw(self.frame_number)
         save_frame(frame=image, index=self.frame_number, indexlength=self.indexlength, output_path=output_path)
 
     def event_find_bad_tracking(self):
         try:
-            find_bad_tracking(self.h5_name)
-        except NotImplementedError:
+            h5_name, rules, pose_store = self.h5_name, self.bad_tracking_rules, self.pose_store
+
+            def find(task):
+                scores = find_bad_tracking(h5_name, rules, pose_store)
+                return scores, BadFrameIndex.load(h5_name, rules.segment_gap)
+
+            def found(result):
+                if pose_store is self.pose_store:
+                    scores, self.bad_frame_index = result
+                    self.update_timeline_heat(scores)
+
+            self.tasks.submit(find, found, self.task_failed, 'Finding bad tracking')
+        except (AttributeError, NotImplementedError):
             QtWidgets.QMessageBox.warning(self, 'Error', 'Make sure to load the h5 file')
 
     def event_move_to_index(self) -> None:
+        self.move_to_bad_frame(forward=True)
+
+    def event_move_to_previous_index(self) -> None:
+        self.move_to_bad_frame(forward=False)
+
+    @timed_action('bad_tracking')
+    def move_to_bad_frame(self, forward=True) -> None:
+        # Bad frames are visited a segment at a time. The segment is filled in as the sequence to swap
         try:
-            self.goto_index, self.index_completion = move_to_index(self.h5_name, self.frame_number)
-            if self.goto_index == '':
-                self.goto_index = '0'
-            try:
-                self.frame_number = int(self.goto_index)
-            except ValueError:
-                QtWidgets.QMessageBox.warning(self, 'ValueError', 'invalid number entered')
+            if self.bad_frame_index is None:
+                self.bad_frame_index = BadFrameIndex.load(self.h5_name, self.bad_tracking_rules.segment_gap)
+                self.update_timeline_heat()
+            if forward:
+                position = self.bad_frame_index.next_segment(self.frame_number)
+            else:
+                position = self.bad_frame_index.previous_segment(self.frame_number)
+            if position is None:
+                QtWidgets.QMessageBox.information(self, 'Bad Tracking', 'No more bad tracking in this direction')
+                return
+            segment = self.bad_frame_index.segments[position]
+            self.frame_number = int(segment['start'])
+            self.frame_from.setText(str(segment['start']))
+            self.frame_to.setText(str(segment['end']))
+            self.index_completion = self.bad_frame_index.segment_progress(position)
+            reasons = ', '.join(self.bad_frame_index.segment_reason_names(position))
+            animals = ', '.join(self.pose_store.individuals[k]
+                                for k in self.bad_frame_index.segment_individual_indices(position))
             self.goto_frame.setText(str(self.frame_number))
-            self.frame_slider_widget.setValue(self.frame_number)
-            self.behavior_index_completion.setText(f'Gone through: {self.index_completion}%')
+            self.set_slider_value(self.frame_number)
+            self.behavior_index_completion.setText(f'Gone through: {self.index_completion}%\n'
+                                                   f'{segment["end"] - segment["start"] + 1} frames\n'
+                                                   f'{reasons} {animals}')
             if self.video_name:
                 if self.frame_number > self.length:
                     self.frame_number = self.length
-                self.cap.set(1, self.frame_number)
-                ret, self.image = self.cap.read()
+                self.image = self.frame_provider.get_frame(self.frame_number)
                 if self.h5_name:
-                    self.h5 = pd.read_hdf(self.h5_name)
                     self.show_image()
                     self.img_plot_tracked_points()
+                    self.frame_number_widget.setText(f"Frames: {self.frame_number} / {self.length}")
                 else:
                     self.show_image()
                     self.frame_number_widget.setText(f"Frames: {self.frame_number} / {self.length}")
         except AttributeError:
             QtWidgets.QMessageBox.warning(self, 'Error', 'Frame does not exits')
+        except FileNotFoundError:
+            QtWidgets.QMessageBox.warning(self, 'Error', 'Find the bad tracking first')
 
     def event_use_wasd_keys(self, use_wasd: bool = True) -> None:
         if use_wasd:
@@ -726,21 +1361,41 @@ class MainGUI(QMainWindow):
             self.jump_forward_key = 'up'
             self.jump_backward_key = 'down'
 
+    def set_slider_value(self, frame_number) -> None:
+        # Update the slider without triggering event_frame_slider, which would read and plot the frame again
+        self.frame_slider_widget.blockSignals(True)
+        self.frame_slider_widget.setValue(frame_number)
+        self.frame_slider_widget.blockSignals(False)
+
     def event_disable_lineedit(self) -> None:
         self.top_toolbar.setFocus()
 
     def my_exit_handler(self) -> None:
         try:
-            if self.video_name:
-                save_last_frame_number(self.frame_number, self.video_name)
+            self.tasks.shutdown()
+            self.remember_video_state()
+            error = self.autosave.stop()
+            if error is not None:
+                print(f'Unable to save the review progress: {error}')
+            self.sessions.close()
+            save_last_frame_numbers({video_name: state.frame_number
+                                     for video_name, state in self.sessions.states().items() if video_name})
         except AttributeError:
             return
+        finally:
+            # Kept next to last_video_frame.yaml, one line per session
+            telemetry.dump(APP_DIR / 'latency_log.jsonl')
+
+
+def main():
+    app = QApplication(sys.argv)
+    gui = MainGUI()
+    gui.setWindowTitle('Pose Correction GUI')
+    app.aboutToQuit.connect(gui.my_exit_handler)
+    gui.setGeometry(0, 0, 600, 600)
+    gui.show()
+    return app.exec()
 
 
-app = QApplication(sys.argv)
-gui = MainGUI()
-gui.setWindowTitle('Pose Correction GUI')
-app.aboutToQuit.connect(gui.my_exit_handler)
-gui.setGeometry(0, 0, 600, 600)
-gui.show()
-sys.exit(app.exec())
+if __name__ == '__main__':
+    sys.exit(main())
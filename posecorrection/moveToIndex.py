@@ -1,23 +1,18 @@
-import numpy as np
-from pathlib import Path
+from .badFrameIndex import BadFrameIndex
 
 
-def move_to_index(h5_path, current_frame_number):
+def move_to_index(h5_path, current_frame_number, bad_frame_index=None):
     """
     Move to the next index based on the file loaded
     :param h5_path: path to the video file
     :param current_frame_number: the current frame number is GUI is on
-    :return:
+    :param bad_frame_index: the BadFrameIndex of the file if it is already loaded
+    :return: the next bad frame and the percentage of bad frames gone through, or None if there are no more
     """
+    if bad_frame_index is None:
+        bad_frame_index = BadFrameIndex.load(h5_path)
 
-    destination_name = Path(h5_path).stem
-    destination_name = destination_name[:destination_name.find('CNN')]
-    destination_name += 'bad_tracking.npy'
-    destination_file = f'{str(Path(h5_path).parent)}/{destination_name}'
-
-    data = np.load(destination_file)
-
-    for i, dt in enumerate(data):
-        if dt > current_frame_number:
-            percentage = np.round((i / data.shape[0]) * 100)
-            return dt, percentage
+    position = bad_frame_index.next(current_frame_number)
+    if position is None:
+        return None
+    return bad_frame_index.frames[position], bad_frame_index.progress(position)
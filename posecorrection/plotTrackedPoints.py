@@ -1,27 +1,26 @@
-def plot_tracked_points(h5, scale_factor, frame_number):
+import numpy as np
+
+
+def plot_tracked_points(pose_store, scale_factor, frame_number):
     """
     plot body points from h5
-    :param h5: the h5 file
+    :param pose_store: the PoseStore with the tracked points
     :param scale_factor: how to resize the points
     :param frame_number: the frame number
-    :return:
+    :return: the resized points with shape (individuals, bodyparts, 2). Missing points stay NaN
     """
 
-    scorer = h5.columns.get_level_values('scorer').unique().item()
-    bodyparts = h5.columns.get_level_values('bodyparts').unique().to_list()
-    individuals = h5.columns.get_level_values('individuals').unique().to_list()
-
-    individual_dict = {}
-    for j, ind in enumerate(individuals):
-
-        individual = h5[scorer][ind]
-        bodypart_dict = {}
+    return np.trunc(pose_store.frame_points(frame_number) * scale_factor)
 
-        for bpt in bodyparts:
-            bpt_values = individual[bpt]
-            bpt_value = bpt_values.iloc[frame_number] * scale_factor
-            bodypart_dict[bpt] = bpt_value.astype('int').to_numpy()
 
-        individual_dict[ind] = bodypart_dict
+def plot_trajectories(pose_store, scale_factor, from_frame, to_frame):
+    """
+    Get the body points for a window of frames, e.g. to draw the trajectories around the current frame
+    :param pose_store: the PoseStore with the tracked points
+    :param scale_factor: how to resize the points
+    :param from_frame: the first frame of the window
+    :param to_frame: the frame to stop at (not included)
+    :return: the resized points with shape (frames, individuals, bodyparts, 2)
+    """
 
-    return individual_dict
+    return pose_store.window(from_frame, to_frame) * scale_factor
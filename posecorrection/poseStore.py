@@ -0,0 +1,400 @@
+import os
+import shutil
+import threading
+import warnings
+import numpy as np
+
+from .editJournal import EditJournal
+from .editHistory import EditHistory
+from .latencyTelemetry import span
+from .atomicFile import replace_file, sync_file
+
+
+def h5_to_coordinates(h5):
+    """
+    Convert the MultiIndex H5 data into a single coordinate array
+    :param h5: the H5 data (not the filepath)
+    :return: the coordinates with shape (frames, individuals, bodyparts, 2), scorer, individuals, bodyparts
+    """
+    import pandas as pd
+    scorer = h5.columns.get_level_values('scorer').unique().item()
+    bodyparts = h5.columns.get_level_values('bodyparts').unique().to_list()
+    individuals = h5.columns.get_level_values('individuals').unique().to_list()
+
+    col = pd.MultiIndex.from_product([[scorer], individuals, bodyparts, ['x', 'y']],
+                                     names=['scorer', 'individuals', 'bodyparts', 'coords'])
+    # A copy of its own, since pandas may hand back a read-only view of its data and the store edits the array
+    coords = np.array(h5.reindex(columns=col), dtype=float, copy=True)
+    coords = coords.reshape(len(h5), len(individuals), len(bodyparts), 2)
+
+    return coords, scorer, individuals, bodyparts
+
+
+def read_coordinates(h5_filename):
+    """
+    Read an H5 file into a single coordinate array
+    :param h5_filename: the filepath for the H5 file
+    :return: the coordinates with shape (frames, individuals, bodyparts, 2), scorer, individuals, bodyparts
+    """
+    import pandas as pd
+    return h5_to_coordinates(pd.read_hdf(h5_filename))
+
+
+def iter_coordinates(h5_filename, chunksize=100000, overlap=0):
+    """
+    Read an H5 file into coordinate arrays one block of frames at a time, so only one block is in memory
+    :param h5_filename: the filepath for the H5 file
+    :param chunksize: the number of frames in each block
+    :param overlap: the number of frames from the end of the previous block to repeat at the start of each block
+    :return: generator of (first frame of the block, coordinates, individuals, bodyparts). Files saved in the fixed
+        format cannot be read in parts and come back as a single block
+    """
+    import pandas as pd
+    with pd.HDFStore(h5_filename, 'r') as df:
+        animal_key = df.keys()[0]
+        storer = df.get_storer(animal_key)
+        if not storer.is_table:
+            warnings.warn(f'{h5_filename} is saved in the fixed format and is read into memory at once. Save it with '
+                          f"format='table' to read it in blocks", stacklevel=2)
+            coords, _, individuals, bodyparts = h5_to_coordinates(df.select(animal_key))
+            yield 0, coords, individuals, bodyparts
+            return
+
+        for start in range(0, storer.nrows, chunksize):
+            first = max(start - overlap, 0)
+            h5 = df.select(animal_key, start=first, stop=start + chunksize)
+            coords, _, individuals, bodyparts = h5_to_coordinates(h5)
+            yield first, coords, individuals, bodyparts
+
+
+class PoseStore:
+    """
+    Holds the tracked points of an H5 file in memory as one array with shape (frames, individuals, bodyparts, 2).
+    Edits are applied in place and logged to an append-only journal. The H5 file is only written when the store
+    is flushed, either on demand or in the background, and then only the edited frames are overwritten in the file
+    """
+
+    def __init__(self, h5_filename):
+        """
+        :param h5_filename: the filepath for the H5 file
+        """
+        import pandas as pd
+        self.h5_filename = h5_filename
+
+        with pd.HDFStore(h5_filename, 'r') as df:
+            self.animal_key = df.keys()[0]
+            self.is_table = df.get_storer(self.animal_key).is_table
+
+        with span('read_hdf'):
+            h5 = pd.read_hdf(h5_filename, self.animal_key)
+        self.coords, self.scorer, self.individuals, self.bodyparts = h5_to_coordinates(h5)
+        self.index = h5.index
+        self._block_columns = self._find_block_columns(h5)
+        self._n_block_columns = len(h5.columns)
+
+        self._lock = threading.RLock()
+        self._flush_thread = None
+        self._flush_requested = False
+
+        # Replay the edits that were never flushed to the H5 file
+        self.journal = EditJournal(h5_filename)
+        for entry in self.journal.entries:
+            self._apply(entry)
+
+        self.history = EditHistory(h5_filename)
+
+    @property
+    def n_frames(self):
+        return self.coords.shape[0]
+
+    def frame_points(self, frame_number):
+        """
+        Get the points of every individual for one frame
+        :param frame_number: the frame number
+        :return: view of the points with shape (individuals, bodyparts, 2)
+        """
+        return self.coords[frame_number]
+
+    def snapshot(self):
+        """
+        Copy the points of every frame, with no edit applied halfway. For reading them away from the edit thread
+        :return: the copy with shape (frames, individuals, bodyparts, 2)
+        """
+        with self._lock:
+            return self.coords.copy()
+
+    def window(self, from_frame, to_frame):
+        """
+        Get the points of every individual for a window of frames
+        :param from_frame: the first frame of the window
+        :param to_frame: the frame to stop at (not included)
+        :return: view of the points with shape (frames, individuals, bodyparts, 2)
+        """
+        return self.coords[max(from_frame, 0):to_frame]
+
+    def individual_indices(self, animal_ident='both'):
+        """
+        Get the indices of the individuals to edit
+        :param animal_ident: the animal identity or 'both' for all individuals
+        :return: list of individual indices
+        """
+        if animal_ident == 'both':
+            return list(range(len(self.individuals)))
+        return [self.individuals.index(animal_ident)]
+
+    def _apply(self, entry):
+        # An entry is one edit or, for edits made as one, a batch of them
+        for part in entry.get('batch', [entry]):
+            frames = slice(part['start'], part['stop'])
+            self.coords[frames, part['individuals']] = part['values']
+
+    def _write(self, parts):
+        # All the parts go in one journal entry, so after a crash either all of them are replayed or none
+        entry = parts[0] if len(parts) == 1 else {'batch': parts}
+        with self._lock:
+            self._apply(entry)
+            self.journal.append(entry)
+
+    def apply_edit(self, start, stop, individuals, values):
+        """
+        Overwrite the points for a range of frames, log the edit to the journal and record it for undo
+        :param start: the first frame to edit
+        :param stop: the frame to stop at (not included)
+        :param individuals: the indices of the individuals to edit
+        :param values: the new points, broadcastable to (stop - start, len(individuals), bodyparts, 2)
+        :return:
+        """
+        self.apply_edits([(start, stop, individuals, values)])
+
+    def apply_edits(self, edits):
+        """
+        Overwrite the points for several ranges of frames as one edit, with one journal entry and one undo step
+        :param edits: list of (start, stop, individuals, values) as for apply_edit, applied in order
+        :return:
+        """
+        parts = []
+        deltas = []
+        with self._lock:
+            for start, stop, individuals, values in edits:
+                start = max(int(start), 0)
+                stop = min(int(stop), self.n_frames)
+                if stop <= start:
+                    continue
+
+                individuals = list(individuals)
+                values = np.broadcast_to(values, (stop - start, len(individuals)) + self.coords.shape[2:]).copy()
+                # The old points are taken after the parts before are applied, so undoing them in reverse order
+                # restores the points when ranges overlap
+                deltas.append({'start': start, 'stop': stop, 'individuals': individuals,
+                               'old': self.coords[start:stop, individuals], 'new': values})
+                part = {'start': start, 'stop': stop, 'individuals': individuals, 'values': values}
+                self._apply(part)
+                parts.append(part)
+            if not parts:
+                return
+            self.journal.append(parts[0] if len(parts) == 1 else {'batch': parts})
+
+        self.history.record(deltas[0] if len(deltas) == 1 else {'batch': deltas})
+
+    def _step(self, delta, values, backward):
+        deltas = delta.get('batch', [delta])
+        if backward:
+            deltas = deltas[::-1]
+        self._write([{'start': part['start'], 'stop': part['stop'], 'individuals': part['individuals'],
+                      'values': part[values]} for part in deltas])
+        return min(part['start'] for part in deltas), max(part['stop'] for part in deltas)
+
+    def undo(self):
+        """
+        Undo the last edit that has not been undone
+        :return: the (start, stop) frame range that changed or None if there is nothing to undo
+        """
+        delta = self.history.undo()
+        if delta is None:
+            return None
+        return self._step(delta, 'old', backward=True)
+
+    def redo(self):
+        """
+        Redo the last edit that was undone
+        :return: the (start, stop) frame range that changed or None if there is nothing to redo
+        """
+        delta = self.history.redo()
+        if delta is None:
+            return None
+        return self._step(delta, 'new', backward=False)
+
+    def columns(self):
+        """
+        Get the MultiIndex columns of the H5 data
+        :return: the columns in the order of the flattened coordinate array
+        """
+        import pandas as pd
+        return pd.MultiIndex.from_product([[self.scorer], self.individuals, self.bodyparts, ['x', 'y']],
+                                          names=['scorer', 'individuals', 'bodyparts', 'coords'])
+
+    def to_dataframe(self, coords=None, h5=None):
+        """
+        Build the MultiIndex H5 data from the coordinate array
+        :param coords: the coordinates to use. Defaults to the current coordinates in the store
+        :param h5: the H5 data to write the points into, so its other columns such as the likelihoods are kept and
+            no columns are added. Defaults to H5 data with the points only
+        :return: the H5 data
+        """
+        import pandas as pd
+        if coords is None:
+            coords = self.coords
+        values = coords.reshape(coords.shape[0], -1)
+        if h5 is None:
+            return pd.DataFrame(values, index=self.index, columns=self.columns())
+
+        # Only the points the file has are written. Files that do not hold every body part of every individual,
+        # such as those with a single individual of its own body parts, keep their columns
+        present = self.columns().isin(h5.columns)
+        dataframe = h5.copy()
+        dataframe.loc[:, self.columns()[present]] = values[:, present]
+        return dataframe
+
+    def _values_node(self, h5file):
+        group = h5file.get_node(self.animal_key)
+        if self.is_table:
+            return group.table
+        return group.block0_values
+
+    def _read_block_rows(self, node, start, stop):
+        if self.is_table:
+            return node.read(start, stop, field='values_block_0')
+        return node[start:stop]
+
+    def _find_block_columns(self, h5):
+        # Edited rows are written straight into the values block of the H5 file. That needs a single block holding
+        # every column in the order of the H5 data, which is how pandas writes a frame of tracked points. The block
+        # may hold more columns than the points, such as the likelihoods, which are left as they are, and fewer, when
+        # an individual does not have every body part. The layout is checked against a few rows of the file and the
+        # whole file is rewritten on flush if it does not match
+        import tables
+        if h5.columns.has_duplicates:
+            return None
+        # The position in the block of each column of the store, or -1 for the points the file does not have
+        block_columns = h5.columns.get_indexer(self.columns())
+
+        try:
+            with tables.open_file(self.h5_filename, 'r') as h5file:
+                group = h5file.get_node(self.animal_key)
+                if self.is_table and 'values_block_1' in group.table.colnames or 'block1_values' in group:
+                    return None
+                node = self._values_node(h5file)
+                for start in np.unique(np.linspace(0, len(h5) - 1, 8, dtype=int)) if len(h5) else []:
+                    block_rows = np.asarray(self._read_block_rows(node, start, start + 1), dtype=float)
+                    if block_rows.shape != (1, len(h5.columns)) or \
+                            not np.array_equal(block_rows, h5.iloc[start:start + 1].to_numpy(dtype=float),
+                                               equal_nan=True):
+                        return None
+        except (tables.NoSuchNodeError, AttributeError, KeyError, ValueError):
+            return None
+
+        return block_columns
+
+    def _dirty_ranges(self, entries):
+        # The frame ranges touched by the journal entries, merged where they overlap or touch
+        ranges = []
+        parts = [part for entry in entries for part in entry.get('batch', [entry])]
+        for start, stop in sorted((part['start'], part['stop']) for part in parts):
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], stop)
+            else:
+                ranges.append([start, stop])
+        return ranges
+
+    def _flush_once(self):
+        import pandas as pd
+        import tables
+        with self._lock:
+            if not len(self.journal):
+                return
+            n_entries = len(self.journal)
+            if self._block_columns is not None:
+                # Only the edited frames are copied and written back. They are copied under the lock, so an edit
+                # made while the file is written is not written half applied
+                ranges = self._dirty_ranges(self.journal.entries[:n_entries])
+                rows = [self.coords[start:stop].reshape(stop - start, -1).copy() for start, stop in ranges]
+            else:
+                coords = self.coords.copy()
+
+        if self._block_columns is not None:
+            # The edited rows are overwritten in place and synced to disk before the journal is truncated. A crash
+            # while writing can leave rows half written, but the journal still has the edits and replays them on load
+            with span('write_h5_rows'), tables.open_file(self.h5_filename, 'r+') as h5file:
+                node = self._values_node(h5file)
+                present = self._block_columns >= 0
+                for (start, stop), values in zip(ranges, rows):
+                    if present.all() and len(self._block_columns) == self._n_block_columns:
+                        block_rows = np.empty((stop - start, self._n_block_columns))
+                    else:
+                        # The other columns of the block are read back, so they are written unchanged
+                        block_rows = np.array(self._read_block_rows(node, start, stop), dtype=float)
+                    block_rows[:, self._block_columns[present]] = values[:, present]
+                    if self.is_table:
+                        node.modify_column(start, stop, column=block_rows, colname='values_block_0')
+                    else:
+                        node[start:stop] = block_rows
+            sync_file(self.h5_filename)
+        else:
+            # A rewrite of the whole file cannot be repaired from the journal if it is cut short, so it goes to a
+            # copy that replaces the file in one step. This only happens once, the file then has a layout the edited
+            # rows can be written into
+            with span('read_hdf'):
+                h5 = pd.read_hdf(self.h5_filename, self.animal_key)
+            dataframe = self.to_dataframe(coords, h5)
+            tmp_file = f'{self.h5_filename}.tmp'
+            try:
+                shutil.copyfile(self.h5_filename, tmp_file)
+                with span('to_hdf'):
+                    dataframe.to_hdf(tmp_file, key=self.animal_key, format='table' if self.is_table else 'fixed')
+                replace_file(tmp_file, self.h5_filename)
+            finally:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+        if self._block_columns is None:
+            # The file now has the layout pandas writes, so the next flush can write the edited rows only
+            self._block_columns = self._find_block_columns(dataframe)
+            self._n_block_columns = len(dataframe.columns)
+        with self._lock:
+            # The history stays with the file as the store wrote it, and is dropped if the file changes otherwise
+            self.history.mark_saved()
+            self.journal.truncate(n_entries)
+
+    def _flush_worker(self):
+        while True:
+            with self._lock:
+                if not self._flush_requested:
+                    self._flush_thread = None
+                    return
+                self._flush_requested = False
+            self._flush_once()
+
+    def flush(self, background=False):
+        """
+        Write the edited points to the H5 file
+        :param background: write the file in a background thread instead of waiting for it
+        :return:
+        """
+        if background:
+            with self._lock:
+                self._flush_requested = True
+                if self._flush_thread is None:
+                    self._flush_thread = threading.Thread(target=self._flush_worker, daemon=True)
+                    self._flush_thread.start()
+            return
+
+        self.wait()
+        self._flush_once()
+
+    def wait(self):
+        """
+        Wait for a background flush to finish
+        :return:
+        """
+        flush_thread = self._flush_thread
+        if flush_thread is not None:
+            flush_thread.join()
@@ -1,21 +1,36 @@
 import cv2
 
 
-def process_frame(image, screen_height, screen_width):
+def display_size(height, width, screen_height, screen_width):
     """
-    Resizes the image before it is plotted in the GUI
-    :param image: the image
+    Get the size a frame is shown at in the GUI
+    :param height: the height of the frame in the original video
+    :param width: the width of the frame in the original video
     :param screen_height: the height of the computer screen
     :param screen_width: the width of the computer screen
-    :return:
+    :return: the (width, height) to show the frame at
     """
-    height, width = image.shape[:2]
     if screen_height < height or screen_width < width:
         scale_factor = 0.5
     else:
         scale_factor = 1
-    height = int(height * scale_factor)
-    width = int(width * scale_factor)
-    dim = (width, height)
+    return int(width * scale_factor), int(height * scale_factor)
+
+
+def process_frame(image, screen_height, screen_width, dim=None):
+    """
+    Resizes the image before it is plotted in the GUI
+    :param image: the image
+    :param screen_height: the height of the computer screen
+    :param screen_width: the width of the computer screen
+    :param dim: the (width, height) to resize to. Defaults to the display size of the image, which is only right when
+        the image has the resolution of the original video
+    :return:
+    """
+    if dim is None:
+        height, width = image.shape[:2]
+        dim = display_size(height, width, screen_height, screen_width)
+    if image.shape[1] == dim[0] and image.shape[0] == dim[1]:
+        return image
     image = cv2.resize(image, dim, interpolation=cv2.INTER_AREA)
     return image
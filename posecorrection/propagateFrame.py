@@ -1,47 +1,134 @@
-import pandas as pd
+import numpy as np
 
 
-def propagate_frame(h5, frame_number, h5_filename, forward_backward='forward', steps=1, animal_ident='both'):
+def propagate_frame(pose_store, frame_number, forward_backward='forward', steps=1, animal_ident='both'):
     """
     Propagate rightly tracked body points forward or backward. Hence, update the next or previous N number of frames
     from the current one. The "N" is defined by the steps
-    :param h5: the H5 data (not the filepath)
+    :param pose_store: the PoseStore with the tracked points
     :param frame_number: the frame number for the current image
-    :param h5_filename: the filepath for the H5 file
     :param forward_backward: propagate forward or backward
     :param steps: the number of frames to update from the current one
     :param animal_ident: the animal identity or identities to use to propagate frames
     :return:
     """
 
-    with pd.HDFStore(h5_filename, 'r') as df:
-        animal_key = df.keys()[0]
-
-    scorer = h5.columns.get_level_values('scorer').unique().item()
-    bodyparts = h5.columns.get_level_values('bodyparts').unique().to_list()
-    individuals = h5.columns.get_level_values('individuals').unique().to_list()
-
-    data_df = pd.DataFrame()
-    for i in range(len(individuals)):
-        data = h5[scorer][individuals[i]].values
-        if animal_ident == 'both':
-            if forward_backward == 'backward':
-                data[frame_number - steps: frame_number, :] = data[frame_number, :]
-            else:
-                data[frame_number + 1: frame_number + steps, :] = data[frame_number, :]
-        else:
-            v = int(animal_ident[-1:]) - 1
-            if i == v:
-                if forward_backward == 'backward':
-                    data[frame_number - steps: frame_number, :] = data[frame_number, :]
-                else:
-                    data[frame_number + 1: frame_number + steps, :] = data[frame_number, :]
-
-        df = pd.DataFrame(data)
-        data_df = pd.concat((data_df, df), axis=1, ignore_index=True)
-
-    col = pd.MultiIndex.from_product([[scorer], individuals, bodyparts, ['x', 'y']],
-                                     names=['scorer', 'individuals', 'bodyparts', 'coords'])
-    data_ind = h5.index
-    dataframe = pd.DataFrame(data_df.values, index=data_ind, columns=col)
-    dataframe.to_hdf(h5_filename, animal_key)
+    individuals = pose_store.individual_indices(animal_ident)
+    data = pose_store.coords[frame_number, individuals]
+
+    if forward_backward == 'backward':
+        pose_store.apply_edit(frame_number - steps, frame_number, individuals, data)
+    else:
+        pose_store.apply_edit(frame_number + 1, frame_number + steps, individuals, data)
+
+
+def interpolate_block(block, method='linear', before=None, after=None, images=None, scale=1.0):
+    """
+    Fill in the frames between the first and last frame of a block of points
+    :param block: the points with shape (frames, ..., 2). The first and last frames are the anchors
+    :param method: 'linear', 'cubic' or 'optical_flow'
+    :param before: the points in the frame before the block, used for the starting speed of the cubic curve
+    :param after: the points in the frame after the block, used for the ending speed of the cubic curve
+    :param images: the video frames of the block, for 'optical_flow'. When fewer frames than the block could be
+        read, only the forward tracks are used
+    :param scale: the scale from the points to the pixels of the images
+    :return: the filled in points with the same shape as the block. The anchors are unchanged
+    """
+    block = np.asarray(block, dtype=float)
+    n_frames = block.shape[0]
+    start, end = block[0], block[-1]
+    t = (np.arange(n_frames) / max(n_frames - 1, 1)).reshape((-1,) + (1,) * (block.ndim - 1))
+
+    linear = start + t * (end - start)
+    if method == 'linear' or n_frames < 3:
+        return linear
+
+    if method == 'cubic':
+        # Cubic Hermite curve between the anchors, with the speed at each anchor taken from its neighbouring frame
+        start_speed = np.nan_to_num(start - before) if before is not None else end - start
+        end_speed = np.nan_to_num(after - end) if after is not None else end - start
+        start_speed = start_speed * (n_frames - 1)
+        end_speed = end_speed * (n_frames - 1)
+        t2, t3 = t ** 2, t ** 3
+        return ((2 * t3 - 3 * t2 + 1) * start + (t3 - 2 * t2 + t) * start_speed +
+                (-2 * t3 + 3 * t2) * end + (t3 - t2) * end_speed)
+
+    if method == 'optical_flow':
+        from .keypointFlow import track_keypoints
+
+        # Track the start points forward and the end points backward, and blend the two towards the anchor each
+        # track started from. Points that are lost on the way fall back to the linear path
+        shape = block.shape[1:]
+        forward = np.full_like(block, np.nan)
+        backward = np.full_like(block, np.nan)
+        images = list(images)[:n_frames]
+        forward_tracks = track_keypoints(images, start.reshape(-1, 2) * scale) / scale
+        forward[:len(forward_tracks)] = forward_tracks.reshape((-1,) + shape)
+        if len(images) == n_frames:
+            backward_tracks = track_keypoints(images[::-1], end.reshape(-1, 2) * scale)[::-1] / scale
+            backward[n_frames - len(backward_tracks):] = backward_tracks.reshape((-1,) + shape)
+
+        flow = (1 - t) * forward + t * backward
+        flow = np.where(np.isnan(flow), np.where(np.isnan(forward), backward, forward), flow)
+        flow = np.where(np.isnan(flow), linear, flow)
+        flow[0], flow[-1] = start, end
+        return flow
+
+    raise ValueError(f'Unknown interpolation method {method}')
+
+
+def read_interpolation_block(pose_store, from_frame, to_frame, animal_ident='both'):
+    """
+    Copy the points to interpolate between two rightly tracked frames, so the interpolation can run away from the
+    edit thread
+    :param pose_store: the PoseStore with the tracked points
+    :param from_frame: the first rightly tracked frame
+    :param to_frame: the last rightly tracked frame
+    :param animal_ident: the animal identity or identities to interpolate
+    :return: the individual indices, the block of points from from_frame to to_frame and the points in the frames
+        before and after the block (None at the ends of the video)
+    """
+    individuals = pose_store.individual_indices(animal_ident)
+    coords = pose_store.coords
+    block = coords[from_frame:to_frame + 1, individuals]
+    before = coords[from_frame - 1, individuals] if from_frame > 0 else None
+    after = coords[to_frame + 1, individuals] if to_frame + 1 < pose_store.n_frames else None
+    return individuals, block, before, after
+
+
+def interpolated_points(block, before, after, method='linear', images=None, scale=1.0):
+    """
+    Get the points that replace the frames between the first and last frame of a block
+    :param block: the points with shape (frames, individuals, bodyparts, 2), from read_interpolation_block
+    :param before: the points in the frame before the block
+    :param after: the points in the frame after the block
+    :param method: 'linear', 'cubic' or 'optical_flow'
+    :param images: the video frames of the block, for 'optical_flow'
+    :param scale: the scale from the points to the pixels of the images
+    :return: the points for the frames between the anchors
+    """
+    values = interpolate_block(block, method, before, after, images, scale)
+    # Points missing at an anchor cannot be interpolated and keep their tracked positions
+    values = np.where(np.isnan(values), block, values)
+    return values[1:-1]
+
+
+def interpolate_frames(pose_store, from_frame, to_frame, animal_ident='both', method='linear', images=None, scale=1.0):
+    """
+    Replace the body points between two rightly tracked frames by interpolating between them, for every individual
+    and body part at once
+    :param pose_store: the PoseStore with the tracked points
+    :param from_frame: the first rightly tracked frame
+    :param to_frame: the last rightly tracked frame
+    :param animal_ident: the animal identity or identities to interpolate
+    :param method: 'linear', 'cubic' or 'optical_flow'
+    :param images: the video frames from from_frame to to_frame, for 'optical_flow'
+    :param scale: the scale from the points to the pixels of the images
+    :return: Edits the points in the pose store
+    """
+
+    if to_frame - from_frame < 2:
+        return
+    individuals, block, before, after = read_interpolation_block(pose_store, from_frame, to_frame, animal_ident)
+    values = interpolated_points(block, before, after, method, images, scale)
+    pose_store.apply_edit(from_frame + 1, to_frame, individuals, values)
@@ -0,0 +1,91 @@
+import argparse
+import os
+import time
+from pathlib import Path
+import cv2
+
+
+def proxy_file(video_name):
+    """
+    Get the filepath of the proxy of a video
+    :param video_name: the filepath for the video
+    :return: the filepath for the proxy video, next to the original
+    """
+    video_path = Path(video_name)
+    return str(video_path.with_name(f'{video_path.stem}.proxy.avi'))
+
+
+def find_proxy(video_name):
+    """
+    Find the proxy of a video
+    :param video_name: the filepath for the video
+    :return: the filepath for the proxy video or None if it has not been made or is older than the video
+    """
+    proxy_name = proxy_file(video_name)
+    if os.path.exists(proxy_name) and os.path.getmtime(proxy_name) >= os.path.getmtime(video_name):
+        return proxy_name
+    return None
+
+
+def make_proxy(video_name, scale=0.5, progress=None, stop_event=None):
+    """
+    Transcode a video into a scaled down proxy for review. The proxy is Motion JPEG, where every frame is a keyframe,
+    so jumping to any frame only decodes that frame
+    :param video_name: the filepath for the video
+    :param scale: the scale of the proxy compared to the original
+    :param progress: called with the number of frames written and the number of frames in the video
+    :param stop_event: threading.Event that stops the transcoding when it is set
+    :return: the filepath for the proxy video or None if it was stopped
+    """
+    cap = cv2.VideoCapture(video_name)
+    if not cap.isOpened():
+        raise ValueError(f'Unable to open {video_name}')
+    length = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    dim = (max(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) * scale), 1),
+           max(int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) * scale), 1))
+
+    proxy_name = proxy_file(video_name)
+    tmp_name = f'{proxy_name[:-len(".avi")]}.tmp.avi'
+    writer = cv2.VideoWriter(tmp_name, cv2.VideoWriter_fourcc(*'MJPG'), fps, dim)
+    try:
+        frame_number = 0
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                return None
+            ret, image = cap.read()
+            if not ret:
+                break
+            writer.write(cv2.resize(image, dim, interpolation=cv2.INTER_AREA))
+            frame_number += 1
+            if progress is not None and frame_number % 500 == 0:
+                progress(frame_number, length)
+    finally:
+        cap.release()
+        writer.release()
+        if stop_event is not None and stop_event.is_set() and os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+    os.replace(tmp_name, proxy_name)
+    return proxy_name
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Make low resolution proxies of videos for faster review in the GUI')
+    parser.add_argument('videos', nargs='+', help='the videos to make proxies of')
+    parser.add_argument('-s', '--scale', type=float, default=0.5, help='the scale of the proxy')
+    parser.add_argument('-f', '--force', action='store_true', help='remake proxies that are already up to date')
+    args = parser.parse_args(args)
+
+    for video_name in args.videos:
+        if not args.force and find_proxy(video_name):
+            print(f'{video_name}: proxy is up to date')
+            continue
+        start_time = time.perf_counter()
+        proxy_name = make_proxy(video_name, args.scale)
+        print(f'{video_name}: wrote {proxy_name} in {time.perf_counter() - start_time:.1f} s')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
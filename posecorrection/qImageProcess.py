@@ -1,7 +1,62 @@
+import cv2
+import numpy as np
 from PyQt5.QtGui import QImage, QPixmap
 
+# Qt 5.14 and later can read BGR images directly, so the channels never have to be swapped
+FORMAT_BGR888 = getattr(QImage, 'Format_BGR888', None)
+
 
 def qt_image_process(image):
-    image = QImage(image.data, image.shape[1], image.shape[0],
+    """
+    Convert a BGR image to a new QPixmap. This is the original conversion and allocates three copies of the image:
+    the swapped QImage, the QPixmap and the resized image before it. FrameConverter is used for the GUI
+    :param image: the BGR image with shape (height, width, 3)
+    :return: the QPixmap
+    """
+    image = QImage(image.data, image.shape[1], image.shape[0], image.strides[0],
                    QImage.Format_RGB888).rgbSwapped()
     return QPixmap.fromImage(image)
+
+
+class FrameConverter:
+    """
+    Converts the BGR frames of the video for the GUI without allocating new images per frame. The QImage is built over
+    the memory of the frame itself when Qt can read BGR, and over an RGB buffer that is reused for every frame
+    otherwise. The pixels are then converted into a new QPixmap, which is the only copy made per frame. Reusing one
+    QPixmap does not save it: the pixmap shown in the scene shares its data, so converting into it detaches and is
+    slower than a new pixmap
+    """
+
+    def __init__(self, bgr=None):
+        """
+        :param bgr: build the QImage over the BGR frame. Defaults to whether Qt supports it
+        """
+        self.bgr = FORMAT_BGR888 is not None if bgr is None else bgr
+        self._buffer = None
+
+    def to_qimage(self, image):
+        """
+        Wrap a BGR image in a QImage. The QImage shares its memory with the image or with the RGB buffer, so it is only
+        valid until the next frame is converted
+        :param image: the BGR image with shape (height, width, 3)
+        :return: the QImage
+        """
+        height, width = image.shape[:2]
+        if not image.flags['C_CONTIGUOUS']:
+            image = np.ascontiguousarray(image)
+        if self.bgr:
+            self._buffer = image
+            return QImage(image.data, width, height, image.strides[0], FORMAT_BGR888)
+
+        if self._buffer is None or self._buffer.shape != image.shape:
+            self._buffer = np.empty_like(image)
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=self._buffer)
+        return QImage(self._buffer.data, width, height, self._buffer.strides[0], QImage.Format_RGB888)
+
+    def to_pixmap(self, image):
+        """
+        Convert a BGR image to a QPixmap
+        :param image: the BGR image with shape (height, width, 3)
+        :return: the QPixmap
+        """
+        return QPixmap.fromImage(self.to_qimage(image))
@@ -1,6 +1,8 @@
 from pathlib import Path
 import yaml
 
+from .atomicFile import atomic_write
+
 
 def save_last_frame_number(frame_number, video_file):
     """
@@ -10,16 +12,24 @@ def save_last_frame_number(frame_number, video_file):
     :param video_file: the name of the video file
     :return:
     """
-    destination_file = Path('.') / 'last_video_frame.yaml'
+    save_last_frame_numbers({video_file: frame_number})
+
 
-    video_frame = {f"{video_file}": frame_number}
+def save_last_frame_numbers(frame_numbers):
+    """
+    Saves the last frame numbers of several videos with a single write. The file is replaced in one step, so a crash
+    while saving leaves the previous file
+    :param frame_numbers: dictionary with the last frame number of each video file
+    :return:
+    """
+    destination_file = Path(__file__).resolve().parent / 'last_video_frame.yaml'
 
-    if not destination_file.exists():
-        with open(destination_file, 'w') as fw:
-            yaml.dump(video_frame, fw, default_flow_style=False, sort_keys=False)
-    else:
+    data = {}
+    if destination_file.exists():
         with open(destination_file, 'r') as fr:
-            data = yaml.load(fr, Loader=yaml.FullLoader)
-            data[f'{video_file}'] = frame_number
-        with open(destination_file, 'w') as fw:
-            yaml.dump(data, fw, default_flow_style=False, sort_keys=False)
+            data = yaml.load(fr, Loader=yaml.FullLoader) or {}
+    for video_file, frame_number in frame_numbers.items():
+        data[f'{video_file}'] = int(frame_number)
+
+    with atomic_write(destination_file, 'w') as fw:
+        yaml.dump(data, fw, default_flow_style=False, sort_keys=False)
@@ -0,0 +1,179 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from .frameProvider import FrameProvider
+from .poseStore import PoseStore
+
+VIDEO_SUFFIXES = ('.mp4', '.avi', '.mov', '.mkv')
+
+
+def h5_belongs_to(h5_name, video_stem):
+    """
+    Check if an H5 file is named after a video: its name is the name of the video followed by 'DLC', '.' or '_', as
+    DeepLabCut names them
+    :param h5_name: the file name of the H5 file
+    :param video_stem: the file name of the video without its suffix
+    :return: whether the H5 file is named after the video
+    """
+    rest = h5_name[len(video_stem):]
+    return h5_name.startswith(video_stem) and rest.startswith(('DLC', '.', '_'))
+
+
+def find_sessions(videos_path, h5_path):
+    """
+    Pair the videos in a folder with the H5 files of their tracked points. An H5 file belongs to a video when its name
+    is the name of the video followed by 'DLC', '.' or '_', as DeepLabCut names them. When it fits more than one video,
+    e.g. mouse1 and mouse1_day2, it belongs to the video with the longest name. The derived files of the GUI (proxies)
+    are left out
+    :param videos_path: the folder with the videos, searched with its subfolders
+    :param h5_path: the folder with the H5 files, searched with its subfolders
+    :return: list of (video filepath, H5 filepath or None), sorted by video. When a video has more than one H5 file,
+        the most recently changed one is used
+    """
+    videos = sorted(path for path in Path(videos_path).rglob('*')
+                    if path.suffix.lower() in VIDEO_SUFFIXES and not path.stem.endswith('.proxy'))
+    h5_files = sorted(Path(h5_path).rglob('*.h5'), key=lambda path: path.stat().st_mtime, reverse=True)
+
+    paired = {}
+    for h5_file in h5_files:
+        matches = [video for video in videos if h5_belongs_to(h5_file.name, video.stem)]
+        if matches:
+            video = max(matches, key=lambda path: len(path.stem))
+            paired.setdefault(video, h5_file)
+    return [(str(video), str(paired[video]) if video in paired else None) for video in videos]
+
+
+class VideoState:
+    """
+    What is remembered about a video while the GUI is open, so switching back to it continues where it was left
+    """
+
+    def __init__(self):
+        self.frame_number = 0
+        self.h5_name = None
+        self.bad_frame_index = None
+        self.thumbnails = None
+        self.progress = None
+
+
+class SessionManager:
+    """
+    Keeps the recently used videos and H5 files open, so switching between recordings does not reopen the video or
+    read the H5 file again. The open FrameProviders and PoseStores are kept in bounded LRUs: the least recently used
+    video is released and the least recently used H5 file is written to disk once there are too many
+    """
+
+    def __init__(self, max_videos=3, max_pose_stores=3):
+        """
+        :param max_videos: the number of videos to keep open
+        :param max_pose_stores: the number of H5 files to keep in memory
+        """
+        self.max_videos = max_videos
+        self.max_pose_stores = max_pose_stores
+        self._frame_providers = OrderedDict()
+        self._pose_stores = OrderedDict()
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def state(self, video_name):
+        """
+        Get the remembered state of a video
+        :param video_name: the filepath for the video
+        :return: the VideoState, which is kept for as long as the GUI is open
+        """
+        with self._lock:
+            if video_name not in self._states:
+                self._states[video_name] = VideoState()
+            return self._states[video_name]
+
+    def states(self):
+        """
+        :return: dictionary with the remembered state of every video that has been opened
+        """
+        with self._lock:
+            return dict(self._states)
+
+    def _get(self, cache, key, open_function, max_size, close):
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+                return value
+
+        # Opened outside the lock, so a slow H5 file does not hold up switching to a video that is already open
+        value = open_function()
+        with self._lock:
+            if key in cache:
+                close(value)
+                cache.move_to_end(key)
+                return cache[key]
+            cache[key] = value
+            evicted = []
+            while len(cache) > max_size:
+                evicted.append(cache.popitem(last=False)[1])
+        for old_value in evicted:
+            close(old_value)
+        return value
+
+    def is_open(self, video_name=None, h5_name=None):
+        """
+        :param video_name: the filepath for the video
+        :param h5_name: the filepath for the H5 file
+        :return: whether the video and the H5 file that are given are both open
+        """
+        with self._lock:
+            return ((video_name is None or video_name in self._frame_providers) and
+                    (h5_name is None or h5_name in self._pose_stores))
+
+    def frame_provider(self, video_name, screen_height, screen_width, proxy_name=None):
+        """
+        Get the FrameProvider of a video, opening it if it is not open
+        :param video_name: the filepath for the video
+        :param screen_height: the height of the computer screen
+        :param screen_width: the width of the computer screen
+        :param proxy_name: the filepath for a proxy of the video, used when the video is opened
+        :return: the FrameProvider
+        """
+        return self._get(self._frame_providers, video_name,
+                         lambda: FrameProvider(video_name, screen_height, screen_width, proxy_name=proxy_name),
+                         self.max_videos, lambda frame_provider: frame_provider.release())
+
+    def replace_frame_provider(self, video_name, frame_provider):
+        """
+        Use a new FrameProvider for a video, e.g. once a proxy of it has been made, and release the old one
+        :param video_name: the filepath for the video
+        :param frame_provider: the new FrameProvider
+        :return:
+        """
+        with self._lock:
+            old_frame_provider = self._frame_providers.get(video_name)
+            self._frame_providers[video_name] = frame_provider
+            self._frame_providers.move_to_end(video_name)
+        if old_frame_provider is not None and old_frame_provider is not frame_provider:
+            old_frame_provider.release()
+
+    def pose_store(self, h5_name):
+        """
+        Get the PoseStore of an H5 file, reading it if it is not in memory. Call it from the edit thread, because an
+        H5 file that is dropped from memory is written to disk first
+        :param h5_name: the filepath for the H5 file
+        :return: the PoseStore
+        """
+        return self._get(self._pose_stores, h5_name, lambda: PoseStore(h5_name), self.max_pose_stores,
+                         lambda pose_store: pose_store.flush())
+
+    def close(self):
+        """
+        Release every video and write every H5 file to disk
+        :return:
+        """
+        with self._lock:
+            frame_providers = list(self._frame_providers.values())
+            pose_stores = list(self._pose_stores.values())
+            self._frame_providers.clear()
+            self._pose_stores.clear()
+        for frame_provider in frame_providers:
+            frame_provider.release()
+        for pose_store in pose_stores:
+            pose_store.flush()
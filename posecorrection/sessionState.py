@@ -0,0 +1,126 @@
+import threading
+import zipfile
+import numpy as np
+
+from .atomicFile import atomic_write
+
+
+def progress_file(video_name):
+    """
+    Get the filepath the review progress of a video is saved in
+    :param video_name: the filepath for the video
+    :return: the filepath for the progress file
+    """
+    return f'{video_name}.progress.npz'
+
+
+class ReviewProgress:
+    """
+    The progress of reviewing one video: the frame it was left at, the H5 file used with it and which frames have been
+    looked at, kept as one bit per frame. It is saved next to the video, replacing the old file in one step
+    """
+
+    def __init__(self, video_name, n_frames):
+        """
+        :param video_name: the filepath for the video
+        :param n_frames: the number of frames in the video
+        """
+        self.file = progress_file(video_name)
+        self.frame_number = 0
+        self.h5_name = ''
+        self.reviewed = np.zeros(n_frames, dtype=bool)
+        self.n_reviewed = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        try:
+            with np.load(self.file) as data:
+                self.frame_number = int(data['frame_number'])
+                self.h5_name = str(data['h5_name'])
+                reviewed = np.unpackbits(data['reviewed'], count=int(data['n_frames'])).astype(bool)
+                self.reviewed[:min(len(reviewed), n_frames)] = reviewed[:n_frames]
+                self.n_reviewed = int(self.reviewed.sum())
+        except (FileNotFoundError, KeyError, ValueError, OSError, zipfile.BadZipFile):
+            pass
+
+    @property
+    def reviewed_fraction(self):
+        return self.n_reviewed / len(self.reviewed) if len(self.reviewed) else 0.0
+
+    def update(self, frame_number, h5_name=None):
+        """
+        Mark a frame as looked at and as the frame to come back to
+        :param frame_number: the frame number
+        :param h5_name: the filepath for the H5 file shown with the video
+        :return:
+        """
+        with self._lock:
+            self.frame_number = int(frame_number)
+            if h5_name:
+                self.h5_name = h5_name
+            if 0 <= frame_number < len(self.reviewed) and not self.reviewed[frame_number]:
+                self.reviewed[frame_number] = True
+                self.n_reviewed += 1
+            self._dirty = True
+
+    def save(self):
+        """
+        Save the progress if it changed since it was last saved. The state is copied under the lock and written
+        outside it, so marking frames is never held up by the disk
+        :return: whether it was saved
+        """
+        with self._lock:
+            if not self._dirty:
+                return False
+            data = {'frame_number': np.int64(self.frame_number), 'h5_name': np.array(self.h5_name),
+                    'n_frames': np.int64(len(self.reviewed)), 'reviewed': np.packbits(self.reviewed)}
+            self._dirty = False
+
+        try:
+            with atomic_write(self.file) as fw:
+                np.savez(fw, **data)
+        except OSError:
+            with self._lock:
+                self._dirty = True
+            raise
+        return True
+
+
+class Autosave:
+    """
+    Runs a checkpoint function on a background thread every few seconds, so saving never pauses the GUI
+    """
+
+    def __init__(self, checkpoint, interval=5.0):
+        """
+        :param checkpoint: the function that saves what changed. It is called on the autosave thread
+        :param interval: the seconds between checkpoints
+        """
+        self.checkpoint = checkpoint
+        self.interval = interval
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._checkpoint()
+
+    def _checkpoint(self):
+        try:
+            self.checkpoint()
+            self.error = None
+        except Exception as error:
+            # Kept to be reported, and tried again at the next checkpoint
+            self.error = error
+
+    def stop(self):
+        """
+        Stop the autosave thread and run a last checkpoint
+        :return: the error of the last checkpoint or None if it succeeded
+        """
+        self._stop.set()
+        self._thread.join()
+        self._checkpoint()
+        return self.error
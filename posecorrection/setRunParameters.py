@@ -16,6 +16,12 @@ def set_run_parameters(parameters=None):
 
     dot_size = 10
 
+    snap_radius = 15 # how far (in pixels) a click can be from a body point and still pick it up
+
+    frame_store = False # store the decoded frames of each video on disk for fast jumps. Uses a lot of disk space
+
+    autosave_interval = 5 # the seconds between saves of the review progress
+
     scale_factor = 0.5 # the scale factor to resize the image. O.5 is recommended
 
     if 'font_small' not in parameters.keys():
@@ -33,4 +39,13 @@ def set_run_parameters(parameters=None):
     if 'dot_size' not in parameters.keys():
         parameters.dot_size = dot_size
 
+    if 'snap_radius' not in parameters.keys():
+        parameters.snap_radius = snap_radius
+
+    if 'autosave_interval' not in parameters.keys():
+        parameters.autosave_interval = autosave_interval
+
+    if 'frame_store' not in parameters.keys():
+        parameters.frame_store = frame_store
+
     return parameters
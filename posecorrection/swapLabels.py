@@ -1,70 +1,56 @@
-import pandas as pd
-
-
-def swap_labels(h5, frame_number, h5_filename):
+def swap_labels(pose_store, frame_number, order=None):
     """
-    Swap the labels for mis-tracked points on the animals for a single frame. Only works for two tracked animals.
-    More than two animals to come in the future
-    :param h5: the H5 data (not file) with the tracked points
+    Swap the labels for mis-tracked points on the animals for a single frame
+    :param pose_store: the PoseStore with the tracked points
     :param frame_number: the frame number
-    :param h5_filename: the filepath for the H5 file
-    :return: Saves the data (by overwriting the H5 file)
+    :param order: the label each animal should get its points from. Defaults to reversing the labels, which swaps
+        two animals
+    :return: Edits the points in the pose store
     """
 
-    with pd.HDFStore(h5_filename, 'r') as df:
-        animal_key = df.keys()[0]
-
-    scorer = h5.columns.get_level_values('scorer').unique().item()
-    bodyparts = h5.columns.get_level_values('bodyparts').unique().to_list()
-    individuals = h5.columns.get_level_values('individuals').unique().to_list()
+    swap_label_sequences(pose_store, frame_number, frame_number + 1, order)
 
-    anim1 = h5[scorer][individuals[0]].values
-    anim2 = h5[scorer][individuals[1]].values
 
-    data1 = anim1.copy()
-    data2 = anim2.copy()
-
-    data1[frame_number, :] = anim2[frame_number, :]
-    data2[frame_number, :] = anim1[frame_number, :]
+def swap_label_sequences(pose_store, from_frame, to_frame, order=None):
+    """
+    Swap the labels for mis-tracked points on the animals for a sequence of frames
+    :param pose_store: the PoseStore with the tracked points
+    :param from_frame: the frame number to start from for the sequence to swap
+    :param to_frame: the frame number to end for the sequence to swap
+    :param order: the label each animal should get its points from, e.g. [1, 2, 0] gives animal 0 the points of
+        label 1. Defaults to reversing the labels, which swaps two animals
+    :return: Edits the points in the pose store
+    """
 
-    data_df = pd.concat((pd.DataFrame(data1), pd.DataFrame(data2)), axis=1, ignore_index=True)
-    col = pd.MultiIndex.from_product([[scorer], individuals, bodyparts, ['x', 'y']],
-                                     names=['scorer', 'individuals', 'bodyparts', 'coords'])
-    data_ind = h5.index
-    dataframe = pd.DataFrame(data_df.values, index=data_ind, columns=col)
-    dataframe.to_hdf(h5_filename, animal_key)
+    pose_store.apply_edit(*swap_edit(pose_store, from_frame, to_frame, order))
 
 
-def swap_label_sequences(h5, from_frame, to_frame, h5_filename):
+def swap_edit(pose_store, from_frame, to_frame, order=None):
     """
-    Swap the labels for mis-tracked points on the animals for a sequence of frames. Only works for two tracked animals.
-    More than two animals to come in the future
-    :param h5: the H5 data (not file) with the tracked points
+    Get the edit that swaps the labels for a sequence of frames
+    :param pose_store: the PoseStore with the tracked points
     :param from_frame: the frame number to start from for the sequence to swap
     :param to_frame: the frame number to end for the sequence to swap
-    :param h5_filename: the filepath for the H5 file
-    :return: Saves the data (by overwriting the H5 file)
+    :param order: the label each animal should get its points from. See swap_label_sequences
+    :return: the (start, stop, individuals, values) of the edit, for PoseStore.apply_edit
     """
 
-    with pd.HDFStore(h5_filename, 'r') as df:
-        animal_key = df.keys()[0]
-
-    scorer = h5.columns.get_level_values('scorer').unique().item()
-    bodyparts = h5.columns.get_level_values('bodyparts').unique().to_list()
-    individuals = h5.columns.get_level_values('individuals').unique().to_list()
+    individuals = list(range(len(pose_store.individuals)))
+    if order is None:
+        order = individuals[::-1]
+    if sorted(order) != individuals:
+        raise ValueError(f'{order} is not an order of the {len(individuals)} individuals')
 
-    anim1 = h5[scorer][individuals[0]].values
-    anim2 = h5[scorer][individuals[1]].values
+    data = pose_store.coords[from_frame:to_frame][:, order]
+    return from_frame, to_frame, individuals, data
 
-    data1 = anim1.copy()
-    data2 = anim2.copy()
 
-    data1[from_frame:to_frame, :] = anim2[from_frame:to_frame, :]
-    data2[from_frame:to_frame, :] = anim1[from_frame:to_frame, :]
+def resolve_swaps(pose_store, segments):
+    """
+    Fix the labels of all the swap segments found by propose_swaps, as one edit that is undone in one step
+    :param pose_store: the PoseStore with the tracked points
+    :param segments: list of (start frame, end frame, order) segments. The end frame is included
+    :return: Edits the points in the pose store
+    """
 
-    data_df = pd.concat((pd.DataFrame(data1), pd.DataFrame(data2)), axis=1, ignore_index=True)
-    col = pd.MultiIndex.from_product([[scorer], individuals, bodyparts, ['x', 'y']],
-                                     names=['scorer', 'individuals', 'bodyparts', 'coords'])
-    data_ind = h5.index
-    dataframe = pd.DataFrame(data_df.values, index=data_ind, columns=col)
-    dataframe.to_hdf(h5_filename, animal_key)
+    pose_store.apply_edits([swap_edit(pose_store, start, end + 1, order) for start, end, order in segments])
@@ -0,0 +1,117 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class Task:
+    """
+    Handle of a task running in the background. The task function gets it as its only argument, to report progress and
+    to check if it was cancelled
+    """
+
+    def __init__(self, runner, description, edit=False):
+        self.runner = runner
+        self.description = description
+        self.edit = edit
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """
+        Ask the task to stop. Its result is dropped either way
+        :return:
+        """
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def report(self, value, maximum=100):
+        """
+        Report how far the task is
+        :param value: the amount of work done
+        :param maximum: the total amount of work
+        :return:
+        """
+        self.runner.progress.emit(self, int(value), int(maximum))
+
+
+class TaskRunner(QObject):
+    """
+    Runs long operations on background threads and hands their results back to the GUI thread through Qt signals,
+    so the event loop never blocks. Edits of the pose data go through a single thread so they are applied in the order
+    they were made, while other work shares a small pool of threads
+    """
+
+    started = pyqtSignal(object)
+    progress = pyqtSignal(object, int, int)
+    finished = pyqtSignal(object, object, object)
+
+    def __init__(self, max_workers=2, parent=None):
+        """
+        :param max_workers: the number of threads for the work that is not an edit
+        :param parent: the parent QObject
+        """
+        super().__init__(parent)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._edits = ThreadPoolExecutor(max_workers=1)
+        self._callbacks = {}
+        self.active = set()
+        self.finished.connect(self._on_finished)
+
+    def submit(self, function, on_done=None, on_error=None, description='', edit=False):
+        """
+        Run a function in the background
+        :param function: the function to run. It gets the Task as its only argument
+        :param on_done: called on the GUI thread with the result of the function, unless the task was cancelled
+        :param on_error: called on the GUI thread with the exception if the function failed
+        :param description: what the task does, for the progress display
+        :param edit: run the function on the edit thread, after all the edits submitted before it
+        :return: the Task
+        """
+        task = Task(self, description, edit)
+        self._callbacks[task] = (on_done, on_error)
+        self.active.add(task)
+        self.started.emit(task)
+
+        def run():
+            if task.cancelled:
+                self.finished.emit(task, None, None)
+                return
+            try:
+                result = function(task)
+            except Exception as error:
+                self.finished.emit(task, None, error)
+                return
+            self.finished.emit(task, result, None)
+
+        (self._edits if edit else self._pool).submit(run)
+        return task
+
+    def _on_finished(self, task, result, error):
+        on_done, on_error = self._callbacks.pop(task, (None, None))
+        self.active.discard(task)
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+        elif not task.cancelled and on_done is not None:
+            on_done(result)
+
+    def cancel_all(self):
+        """
+        Ask every running or waiting task that is not an edit to stop. Edits are always applied, so the pose data and
+        the points shown never miss an edit that was made
+        :return:
+        """
+        for task in list(self.active):
+            if not task.edit:
+                task.cancel()
+
+    def shutdown(self):
+        """
+        Cancel the tasks that are not edits and wait for the edits to be applied
+        :return:
+        """
+        self.cancel_all()
+        self._pool.shutdown(wait=False)
+        self._edits.shutdown(wait=True)
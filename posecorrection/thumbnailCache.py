@@ -0,0 +1,83 @@
+import os
+import cv2
+import numpy as np
+
+
+def thumbnail_file(video_name):
+    """
+    Get the filepath the thumbnails of a video are cached in
+    :param video_name: the filepath for the video
+    :return: the filepath for the thumbnail cache
+    """
+    return f'{video_name}.thumbs.npz'
+
+
+def build_thumbnails(video_name, n_thumbnails=500, height=48, progress=None, stop_event=None, source=None):
+    """
+    Decode the video once from start to end and keep small thumbnails of evenly spaced frames. The frames in between
+    are only grabbed, not converted, and the video is never seeked. The thumbnails are saved next to the video
+    :param video_name: the filepath for the video
+    :param n_thumbnails: the number of thumbnails to make
+    :param height: the height of the thumbnails in pixels
+    :param progress: called with the number of frames read and the number of frames in the video
+    :param stop_event: threading.Event that stops the decoding when it is set
+    :param source: the filepath for a proxy of the video to decode instead, which is much faster to decode
+    :return: the frame numbers with shape (thumbnails,) and the thumbnails with shape (thumbnails, height, width, 3),
+        or None if it was stopped
+    """
+    cap = cv2.VideoCapture(source or video_name)
+    try:
+        length = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = max(int(round(cap.get(cv2.CAP_PROP_FRAME_WIDTH) * height / cap.get(cv2.CAP_PROP_FRAME_HEIGHT))), 1)
+        wanted = np.unique(np.linspace(0, max(length - 1, 0), min(n_thumbnails, max(length, 1)), dtype=int))
+
+        frames, thumbnails = [], []
+        next_wanted = 0
+        for frame_number in range(length):
+            if stop_event is not None and stop_event.is_set():
+                return None
+            if not cap.grab():
+                break
+            if next_wanted < len(wanted) and frame_number == wanted[next_wanted]:
+                ret, image = cap.retrieve()
+                if ret:
+                    frames.append(frame_number)
+                    thumbnails.append(cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA))
+                next_wanted += 1
+            if progress is not None and frame_number % 500 == 0:
+                progress(frame_number, length)
+    finally:
+        cap.release()
+
+    frames = np.array(frames, dtype=np.int64)
+    thumbnails = np.array(thumbnails, dtype=np.uint8).reshape(-1, height, width, 3)
+    tmp_file = f'{thumbnail_file(video_name)}.tmp.npz'
+    np.savez(tmp_file, frames=frames, thumbnails=thumbnails)
+    os.replace(tmp_file, thumbnail_file(video_name))
+    return frames, thumbnails
+
+
+def load_thumbnails(video_name):
+    """
+    Load the cached thumbnails of a video
+    :param video_name: the filepath for the video
+    :return: the frame numbers and the thumbnails, or None if they have not been made or are older than the video
+    """
+    cache_file = thumbnail_file(video_name)
+    if not os.path.exists(cache_file) or os.path.getmtime(cache_file) < os.path.getmtime(video_name):
+        return None
+    with np.load(cache_file) as data:
+        return data['frames'], data['thumbnails']
+
+
+def nearest_thumbnail(frames, frame_number):
+    """
+    Find the thumbnail closest to a frame
+    :param frames: the sorted frame numbers of the thumbnails
+    :param frame_number: the frame number
+    :return: the index of the closest thumbnail
+    """
+    index = int(np.searchsorted(frames, frame_number))
+    if index == len(frames) or index > 0 and frame_number - frames[index - 1] < frames[index] - frame_number:
+        index -= 1
+    return max(index, 0)
@@ -0,0 +1,132 @@
+import numpy as np
+from PyQt5.QtWidgets import QWidget, QSizePolicy
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QPen
+
+
+def array_to_pixmap(image):
+    """
+    Convert an RGB image array to a QPixmap
+    :param image: the image with shape (height, width, 3)
+    :return: the QPixmap
+    """
+    image = np.ascontiguousarray(image)
+    q_image = QImage(image.data, image.shape[1], image.shape[0], image.strides[0], QImage.Format_RGB888)
+    return QPixmap.fromImage(q_image.copy())
+
+
+class TimelineWidget(QWidget):
+    """
+    Overview of the whole recording: a strip of thumbnails with a heatmap of the bad tracking scores under it and a
+    marker at the current frame. Clicking or dragging on it asks for a frame. The strip and heatmap are drawn once
+    for the current size and reused on every repaint
+    """
+
+    frame_selected = pyqtSignal(int)
+
+    def __init__(self, parent=None, heat_height=10):
+        """
+        :param parent: the parent widget
+        :param heat_height: the height of the heatmap in pixels
+        """
+        super().__init__(parent)
+        self.heat_height = heat_height
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        self.setFixedHeight(48 + heat_height)
+
+        self.length = 1
+        self.current_frame = 0
+        self.thumbnail_frames = None
+        self.thumbnails = None
+        self.heat = None
+        self._strip = None
+        self._heat_strip = None
+
+    def set_length(self, length):
+        self.length = max(int(length), 1)
+        self._invalidate()
+
+    def set_thumbnails(self, frames, thumbnails):
+        """
+        :param frames: the frame numbers of the thumbnails
+        :param thumbnails: the BGR thumbnails with shape (thumbnails, height, width, 3)
+        """
+        self.thumbnail_frames = np.asarray(frames)
+        self.thumbnails = thumbnails[..., ::-1] if thumbnails is not None else None
+        self._strip = None
+        self.update()
+
+    def set_heat(self, heat):
+        """
+        :param heat: the score of every frame, scaled so 1 is the bad tracking threshold. None clears the heatmap
+        """
+        self.heat = None if heat is None else np.asarray(heat, dtype=float)
+        self._heat_strip = None
+        self.update()
+
+    def set_current_frame(self, frame_number):
+        self.current_frame = frame_number
+        self.update()
+
+    def _invalidate(self):
+        self._strip = None
+        self._heat_strip = None
+        self.update()
+
+    def resizeEvent(self, event):
+        self._invalidate()
+        super().resizeEvent(event)
+
+    def _build_strip(self, width):
+        # Fill the width with as many thumbnails as fit, each showing the frame closest to the middle of its slot
+        thumb_height, thumb_width = self.thumbnails.shape[1:3]
+        n_slots = max(width // thumb_width, 1)
+        slot_frames = (np.arange(n_slots) + 0.5) * self.length / n_slots
+        index = np.clip(np.searchsorted(self.thumbnail_frames, slot_frames), 0, len(self.thumbnail_frames) - 1)
+        strip = np.concatenate(self.thumbnails[index], axis=1)
+        return array_to_pixmap(strip).scaled(width, thumb_height)
+
+    def _build_heat_strip(self, width):
+        # The worst score of the frames under each pixel column, from green (good) to red (at or over the threshold)
+        heat = np.nan_to_num(self.heat)
+        starts = np.minimum(np.linspace(0, len(heat), width, endpoint=False).astype(int), len(heat) - 1)
+        column = np.maximum.reduceat(heat, starts)
+        column = np.clip(column, 0, 1)
+        colors = np.zeros((self.heat_height, width, 3), dtype=np.uint8)
+        colors[..., 0] = (255 * column).astype(np.uint8)
+        colors[..., 1] = (160 * (1 - column)).astype(np.uint8)
+        return array_to_pixmap(colors)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        width = self.width()
+        strip_height = self.height() - self.heat_height
+
+        if self.thumbnails is not None and len(self.thumbnails):
+            if self._strip is None:
+                self._strip = self._build_strip(width)
+            painter.drawPixmap(0, 0, width, strip_height, self._strip)
+        else:
+            painter.fillRect(0, 0, width, strip_height, Qt.darkGray)
+
+        if self.heat is not None and len(self.heat):
+            if self._heat_strip is None:
+                self._heat_strip = self._build_heat_strip(width)
+            painter.drawPixmap(0, strip_height, width, self.heat_height, self._heat_strip)
+
+        x = int(self.current_frame / self.length * width)
+        painter.setPen(QPen(Qt.yellow, 2))
+        painter.drawLine(x, 0, x, self.height())
+        painter.end()
+
+    def _select(self, x):
+        frame_number = int(np.clip(x / max(self.width(), 1) * self.length, 0, self.length))
+        self.set_current_frame(frame_number)
+        self.frame_selected.emit(frame_number)
+
+    def mousePressEvent(self, event):
+        self._select(event.x())
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.LeftButton:
+            self._select(event.x())
@@ -0,0 +1,321 @@
+import warnings
+from itertools import combinations
+from easydict import EasyDict as eDict
+import numpy as np
+
+# The order of the rules in the reason bitmask of a bad frame
+RULE_NAMES = ['area', 'bodypart_distance', 'velocity', 'inter_animal']
+
+BAD_FRAME_DTYPE = np.dtype([('frame', np.int64), ('reasons', np.uint8), ('individuals', np.uint64)])
+
+SEGMENT_DTYPE = np.dtype([('start', np.int64), ('end', np.int64), ('reasons', np.uint8), ('individuals', np.uint64)])
+
+
+def set_tracking_rules(rules=None):
+    """
+    Fill in the settings of the bad tracking rules that were not given
+    :param rules: dictionary with the settings to use, e.g. the bad_tracking section of config.yaml
+    :return: the rules with every setting filled in
+    """
+
+    if isinstance(rules, dict):
+        rules = eDict(rules)
+    else:
+        rules = eDict()
+
+    # Pairs of body points on the same animal whose distance should stay about the same
+    bodypart_pairs = [['Nose', 'betweenEars'], ['tailStart', 'midHip']]
+
+    # Body points used to fit an ellipse to the animal. The front point gives the long axis and the two side
+    # points give the center and the short axis
+    area_bodyparts = ['Nose', 'leftMidWaist', 'rightMidWaist']
+
+    area_tolerance = 0.5 # flag frames where the area is more than this fraction away from the median area
+
+    mad_multiplier = 2.75 # how many MADs a body point distance can be from the median distance
+
+    velocity_multiplier = 10 # how many MADs a body point can move between frames
+
+    proximity_multiplier = 2.75 # how many MADs the animals can be closer together than their median distance
+
+    # The rules that mark a frame as bad tracking. All the rules are scored either way
+    flag_rules = ['area', 'bodypart_distance']
+
+    segment_gap = 5 # bad frames at most this many good frames apart are reviewed as one segment
+
+    if 'bodypart_pairs' not in rules.keys():
+        rules.bodypart_pairs = bodypart_pairs
+
+    if 'area_bodyparts' not in rules.keys():
+        rules.area_bodyparts = area_bodyparts
+
+    if 'area_tolerance' not in rules.keys():
+        rules.area_tolerance = area_tolerance
+
+    if 'mad_multiplier' not in rules.keys():
+        rules.mad_multiplier = mad_multiplier
+
+    if 'velocity_multiplier' not in rules.keys():
+        rules.velocity_multiplier = velocity_multiplier
+
+    if 'proximity_multiplier' not in rules.keys():
+        rules.proximity_multiplier = proximity_multiplier
+
+    if 'flag_rules' not in rules.keys():
+        rules.flag_rules = flag_rules
+
+    if 'segment_gap' not in rules.keys():
+        rules.segment_gap = segment_gap
+
+    return rules
+
+
+def bodypart_distances(coords, pairs):
+    """
+    Calculate the distance between pairs of body points for every frame and individual
+    :param coords: the coordinates with shape (frames, individuals, bodyparts, 2)
+    :param pairs: the (bodypart, bodypart) indices of each pair
+    :return: the distances with shape (frames, individuals, pairs)
+    """
+    pairs = np.asarray(pairs, dtype=int).reshape(-1, 2)
+    return np.linalg.norm(coords[:, :, pairs[:, 0]] - coords[:, :, pairs[:, 1]], axis=-1)
+
+
+def animal_area(coords, front, left, right):
+    """
+    Calculate the area of every animal assuming it has an ellipsoid shape
+    :param coords: the coordinates with shape (frames, individuals, bodyparts, 2)
+    :param front: the index of the body point at the end of the long axis
+    :param left: the index of the left body point of the short axis
+    :param right: the index of the right body point of the short axis
+    :return: the areas with shape (frames, individuals)
+    """
+    center = (coords[:, :, left] + coords[:, :, right]) / 2
+    a_dist = np.linalg.norm(coords[:, :, front] - center, axis=-1)
+    b_dist = np.linalg.norm(center - coords[:, :, left], axis=-1)
+    return np.pi * a_dist * b_dist
+
+
+def bodypart_velocities(coords):
+    """
+    Calculate how far every body point moves from the previous frame
+    :param coords: the coordinates with shape (frames, individuals, bodyparts, 2)
+    :return: the distances with shape (frames, individuals, bodyparts). The first frame is NaN
+    """
+    velocities = np.full(coords.shape[:-1], np.nan)
+    velocities[1:] = np.linalg.norm(np.diff(coords, axis=0), axis=-1)
+    return velocities
+
+
+def inter_animal_distances(coords):
+    """
+    Calculate the distance between the centroids of every pair of animals
+    :param coords: the coordinates with shape (frames, individuals, bodyparts, 2)
+    :return: the distances with shape (frames, pairs of individuals)
+    """
+    with warnings.catch_warnings():
+        # Frames where an animal has no tracked points give a NaN centroid
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        centroids = np.nanmean(coords, axis=2)
+    pairs = np.array(list(combinations(range(coords.shape[1]), 2)), dtype=int).reshape(-1, 2)
+    return np.linalg.norm(centroids[:, pairs[:, 0]] - centroids[:, pairs[:, 1]], axis=-1)
+
+
+def _mad_score(values, multiplier, median, mad, side='both'):
+    # How far each value is from the median in units of multiplier * MAD. A score above 1 is an outlier
+    deviation = values - median
+    if side == 'low':
+        deviation = -deviation
+    elif side == 'both':
+        deviation = np.abs(deviation)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return deviation / (multiplier * mad)
+
+
+def median_mad(values):
+    """
+    Calculate the median and MAD along the frames. The MAD is taken around the mean, the same way the detector has
+    always done it
+    :param values: the values of a rule with the frames on the first axis
+    :return: the median and MAD. Columns without any tracked frame give NaN
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        median = np.nanmedian(values, axis=0)
+        mad = np.nanmedian(np.abs(values - np.nanmean(values, axis=0)), axis=0)
+    return median, mad
+
+
+def score_individuals(coords, bodyparts, rules=None, stats=None):
+    """
+    Score every frame and individual against the bad tracking rules in one pass over the coordinate array
+    :param coords: the coordinates with shape (frames, individuals, bodyparts, 2)
+    :param bodyparts: the names of the body parts
+    :param rules: the rules from set_tracking_rules. Defaults to the default rules
+    :param stats: the medians and MADs to score against, from tracking_stats. Defaults to the stats of coords
+    :return: dictionary with the score of each rule with shape (frames, individuals). A score above 1 breaks the
+        rule. The inter-animal score of a pair of animals is given to both of them
+    """
+    rules = set_tracking_rules(rules)
+    coords = np.asarray(coords, dtype=float)
+    n_frames, n_individuals = coords.shape[:2]
+    values = rule_values(coords, bodyparts, rules)
+    if stats is None:
+        stats = {name: median_mad(value) for name, value in values.items()}
+
+    scores = {}
+    for name, value in values.items():
+        median, mad = stats[name]
+        if name == 'area':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                score = np.abs(value - median) / (rules.area_tolerance * median)
+        elif name == 'bodypart_distance':
+            score = _mad_score(value, rules.mad_multiplier, median, mad)
+        elif name == 'velocity':
+            score = _mad_score(value, rules.velocity_multiplier, median, mad, side='high')
+        else:
+            score = _mad_score(value, rules.proximity_multiplier, median, mad, side='low')
+        score = np.clip(np.where(np.isfinite(score), score, 0), 0, None)
+
+        if name == 'inter_animal':
+            pair_score = score
+            score = np.zeros((n_frames, n_individuals))
+            for k, (ind1, ind2) in enumerate(combinations(range(n_individuals), 2)):
+                score[:, ind1] = np.maximum(score[:, ind1], pair_score[:, k])
+                score[:, ind2] = np.maximum(score[:, ind2], pair_score[:, k])
+        else:
+            score = score.reshape(n_frames, n_individuals, -1)
+            score = score.max(axis=2) if score.shape[2] else np.zeros((n_frames, n_individuals))
+        scores[name] = score
+
+    return scores
+
+
+def score_tracking(coords, bodyparts, rules=None, stats=None):
+    """
+    Score every frame against the bad tracking rules in one pass over the coordinate array
+    :param coords: the coordinates with shape (frames, individuals, bodyparts, 2)
+    :param bodyparts: the names of the body parts
+    :param rules: the rules from set_tracking_rules. Defaults to the default rules
+    :param stats: the medians and MADs to score against, from tracking_stats. Defaults to the stats of coords
+    :return: dictionary with the per-frame score of each rule. A score above 1 breaks the rule
+    """
+    return frame_scores(score_individuals(coords, bodyparts, rules, stats))
+
+
+def frame_scores(individual_scores):
+    """
+    Get the per-frame score of each rule from the per-individual scores
+    :param individual_scores: the scores from score_individuals
+    :return: dictionary with the per-frame score of each rule
+    """
+    return {name: score.max(axis=1) if score.shape[1] else np.zeros(score.shape[0])
+            for name, score in individual_scores.items()}
+
+
+def tracking_stats(coords, bodyparts, rules=None):
+    """
+    Calculate the medians and MADs the rules score against
+    :param coords: the coordinates with shape (frames, individuals, bodyparts, 2)
+    :param bodyparts: the names of the body parts
+    :param rules: the rules from set_tracking_rules. Defaults to the default rules
+    :return: dictionary with the (median, mad) of each rule
+    """
+    rules = set_tracking_rules(rules)
+    values = rule_values(np.asarray(coords, dtype=float), bodyparts, rules)
+    return {name: median_mad(value) for name, value in values.items()}
+
+
+def rule_values(coords, bodyparts, rules):
+    """
+    Calculate the measurements each rule looks at. Rules whose body parts are not in the file are left out
+    :param coords: the coordinates with shape (frames, individuals, bodyparts, 2)
+    :param bodyparts: the names of the body parts
+    :param rules: the rules from set_tracking_rules
+    :return: dictionary with the values of each rule, with the frames on the first axis
+    """
+    bodyparts = list(bodyparts)
+    values = {}
+
+    if all(bpt in bodyparts for bpt in rules.area_bodyparts):
+        values['area'] = animal_area(coords, *(bodyparts.index(bpt) for bpt in rules.area_bodyparts))
+
+    pairs = [[bodyparts.index(bpt1), bodyparts.index(bpt2)] for bpt1, bpt2 in rules.bodypart_pairs
+             if bpt1 in bodyparts and bpt2 in bodyparts]
+    if pairs:
+        values['bodypart_distance'] = bodypart_distances(coords, pairs)
+
+    values['velocity'] = bodypart_velocities(coords)
+
+    if coords.shape[1] > 1:
+        values['inter_animal'] = inter_animal_distances(coords)
+
+    return values
+
+
+def flag_frames(scores, rules=None):
+    """
+    Get the frames that break any of the flag rules
+    :param scores: the per-frame scores from score_tracking
+    :param rules: the rules from set_tracking_rules. Defaults to the default rules
+    :return: sorted array of the bad frame numbers
+    """
+    rules = set_tracking_rules(rules)
+    flags = None
+    for name in rules.flag_rules:
+        if name in scores:
+            flags = scores[name] > 1 if flags is None else flags | (scores[name] > 1)
+    if flags is None:
+        return np.array([], dtype=int)
+    return np.flatnonzero(flags)
+
+
+def flag_details(individual_scores, rules=None):
+    """
+    Get the frames that break any of the flag rules, with the rules they break and the individuals that break them
+    :param individual_scores: the scores from score_individuals
+    :param rules: the rules from set_tracking_rules. Defaults to the default rules
+    :return: array with the BAD_FRAME_DTYPE fields, sorted by frame. The reasons are a bitmask over RULE_NAMES and
+        the individuals a bitmask over the individual indices
+    """
+    rules = set_tracking_rules(rules)
+    n_frames = len(next(iter(individual_scores.values()))) if individual_scores else 0
+    reasons = np.zeros(n_frames, dtype=np.uint8)
+    individuals = np.zeros(n_frames, dtype=np.uint64)
+    for name in rules.flag_rules:
+        if name not in individual_scores:
+            continue
+        broken = individual_scores[name] > 1
+        reasons[broken.any(axis=1)] |= np.uint8(1 << RULE_NAMES.index(name))
+        bits = np.left_shift(np.uint64(1), np.arange(broken.shape[1], dtype=np.uint64))
+        individuals |= np.bitwise_or.reduce(np.where(broken, bits, np.uint64(0)), axis=1)
+
+    flagged = np.flatnonzero(reasons)
+    details = np.zeros(len(flagged), dtype=BAD_FRAME_DTYPE)
+    details['frame'] = flagged
+    details['reasons'] = reasons[flagged]
+    details['individuals'] = individuals[flagged]
+    return details
+
+
+def merge_segments(bad_frames, gap=0):
+    """
+    Merge bad frames that are close together into segments to review as a whole
+    :param bad_frames: array with the BAD_FRAME_DTYPE fields, sorted by frame without duplicates
+    :param gap: the largest number of good frames between two bad frames of the same segment
+    :return: array with the SEGMENT_DTYPE fields. The end frame is included in the segment and the reasons and
+        individuals are combined over the segment
+    """
+    frames = bad_frames['frame']
+    segments = np.zeros(0, dtype=SEGMENT_DTYPE)
+    if len(frames) == 0:
+        return segments
+
+    first = np.concatenate(([0], np.flatnonzero(np.diff(frames) > gap + 1) + 1))
+    last = np.concatenate((first[1:] - 1, [len(frames) - 1]))
+    segments = np.zeros(len(first), dtype=SEGMENT_DTYPE)
+    segments['start'] = frames[first]
+    segments['end'] = frames[last]
+    segments['reasons'] = np.bitwise_or.reduceat(bad_frames['reasons'], first)
+    segments['individuals'] = np.bitwise_or.reduceat(bad_frames['individuals'], first)
+    return segments
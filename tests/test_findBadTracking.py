@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from posecorrection.benchmarkPipeline import make_pose_file
+from posecorrection.findBadTracking import find_bad_tracking, find_bad_tracking_chunked, bad_tracking_file
+
+
+@pytest.mark.parametrize('chunksize', [97, 500, 5000])
+def test_chunked_matches_whole_file(tmp_path, chunksize):
+    h5_filename = str(tmp_path / 'video1DLC_resnet50.h5')
+    make_pose_file(h5_filename, 2000, n_animals=2, n_bodyparts=6, h5_format='table')
+
+    find_bad_tracking(h5_filename)
+    expected = np.load(bad_tracking_file(h5_filename))
+    # With every frame in the sample, the medians and MADs are the same as for the whole file
+    n_flagged = find_bad_tracking_chunked(h5_filename, chunksize=chunksize, sample_size=2000)
+    flagged = np.load(bad_tracking_file(h5_filename))
+
+    assert len(expected) > 0
+    assert n_flagged == len(expected)
+    np.testing.assert_array_equal(flagged, expected)
+
+
+def test_chunked_warns_on_fixed_format(tmp_path):
+    h5_filename = str(tmp_path / 'video1DLC_resnet50.h5')
+    make_pose_file(h5_filename, 500, h5_format='fixed')
+    with pytest.warns(UserWarning, match="format='table'"):
+        find_bad_tracking_chunked(h5_filename, chunksize=100)
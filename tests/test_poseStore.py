@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from posecorrection.benchmarkPipeline import make_pose_file
+from posecorrection.poseStore import PoseStore
+from posecorrection.swapLabels import swap_label_sequences, resolve_swaps
+
+N_FRAMES = 200
+
+
+@pytest.fixture(params=[('table', True), ('table', False), ('fixed', True), ('fixed', False)],
+                ids=['table-likelihood', 'table', 'fixed-likelihood', 'fixed'])
+def h5_file(request, tmp_path):
+    h5_format, likelihood = request.param
+    h5_filename = str(tmp_path / 'video1DLC_resnet50.h5')
+    make_pose_file(h5_filename, N_FRAMES, n_animals=2, n_bodyparts=4, h5_format=h5_format, likelihood=likelihood)
+    return h5_filename
+
+
+def test_edit_flush_reload(h5_file):
+    original = pd.read_hdf(h5_file)
+    pose_store = PoseStore(h5_file)
+    pose_store.apply_edit(10, 20, [0], 5.0)
+    swap_label_sequences(pose_store, 50, 60)
+    expected = pose_store.coords.copy()
+    pose_store.flush()
+    assert not pose_store.journal.journal_file.exists()
+
+    reloaded = PoseStore(h5_file)
+    np.testing.assert_array_equal(reloaded.coords, expected)
+
+    # The columns of the file, with the likelihoods, are kept as they were
+    h5 = pd.read_hdf(h5_file)
+    assert h5.columns.equals(original.columns)
+    other = [column for column in h5.columns if column[-1] not in ('x', 'y')]
+    pd.testing.assert_frame_equal(h5[other], original[other])
+
+
+def test_background_flush(h5_file):
+    pose_store = PoseStore(h5_file)
+    for start in range(0, 100, 10):
+        pose_store.apply_edit(start, start + 5, [1], float(start))
+        pose_store.flush(background=True)
+    pose_store.wait()
+    pose_store.flush()
+    np.testing.assert_array_equal(PoseStore(h5_file).coords, pose_store.coords)
+
+
+def test_journal_replay_after_truncated_entry(h5_file):
+    pose_store = PoseStore(h5_file)
+    pose_store.apply_edit(10, 20, [0], 1.0)
+    pose_store.apply_edit(30, 40, [1], 2.0)
+    expected = pose_store.coords.copy()
+    journal_file = pose_store.journal.journal_file
+    # A crash while the next entry was written
+    with open(journal_file, 'ab') as fw:
+        fw.write(b'\x80\x05\x95\x10\x00')
+
+    replayed = PoseStore(h5_file)
+    np.testing.assert_array_equal(replayed.coords, expected)
+    assert len(replayed.journal) == 2
+
+    # The broken entry was cut off, so the edits after it are replayed as well
+    replayed.apply_edit(60, 70, [0], 3.0)
+    np.testing.assert_array_equal(PoseStore(h5_file).coords, replayed.coords)
+
+
+def test_undo_redo_across_reopen(h5_file):
+    original = PoseStore(h5_file).coords.copy()
+    pose_store = PoseStore(h5_file)
+    pose_store.apply_edit(10, 20, [0], 1.0)
+    pose_store.apply_edit(15, 25, [0, 1], 2.0)
+    edited = pose_store.coords.copy()
+    pose_store.flush()
+
+    reopened = PoseStore(h5_file)
+    assert reopened.undo() == (15, 25)
+    assert reopened.undo() == (10, 20)
+    assert reopened.undo() is None
+    np.testing.assert_array_equal(reopened.coords, original)
+
+    reopened = PoseStore(h5_file)
+    assert reopened.redo() == (10, 20)
+    assert reopened.redo() == (15, 25)
+    assert reopened.redo() is None
+    np.testing.assert_array_equal(reopened.coords, edited)
+
+
+def test_resolve_swaps_is_one_undo_step(h5_file):
+    pose_store = PoseStore(h5_file)
+    original = pose_store.coords.copy()
+    resolve_swaps(pose_store, [(10, 19, [1, 0]), (40, 49, [1, 0])])
+    np.testing.assert_array_equal(pose_store.coords[10:20], original[10:20, ::-1])
+    assert len(pose_store.journal) == 1
+
+    assert pose_store.undo() == (10, 50)
+    np.testing.assert_array_equal(pose_store.coords, original)
+    assert pose_store.undo() is None
+
+
+def test_history_dropped_when_file_replaced(h5_file, tmp_path):
+    pose_store = PoseStore(h5_file)
+    pose_store.apply_edit(10, 20, [0], 1.0)
+    pose_store.flush()
+
+    make_pose_file(h5_file, N_FRAMES + 1, n_animals=2, n_bodyparts=4, seed=1)
+    replaced = PoseStore(h5_file)
+    assert replaced.undo() is None
+
+
+@pytest.mark.parametrize('h5_format', ['table', 'fixed'])
+@pytest.mark.parametrize('rewrite', [False, True], ids=['rows', 'rewrite'])
+def test_flush_keeps_columns_of_single_individual(tmp_path, h5_format, rewrite):
+    # Multi-animal files have the unique body parts under a 'single' individual, so not every individual has every
+    # body part
+    columns = [('scorer', individual, bodypart, coord)
+               for individual, bodyparts in (('animal1', ['nose', 'tail']), ('animal2', ['nose', 'tail']),
+                                             ('single', ['corner']))
+               for bodypart in bodyparts for coord in ('x', 'y', 'likelihood')]
+    columns = pd.MultiIndex.from_tuples(columns, names=['scorer', 'individuals', 'bodyparts', 'coords'])
+    values = np.random.default_rng(0).uniform(0, 100, size=(N_FRAMES, len(columns)))
+    h5_filename = str(tmp_path / 'maDLC.h5')
+    pd.DataFrame(values, columns=columns).to_hdf(h5_filename, key='df_with_missing', format=h5_format)
+
+    pose_store = PoseStore(h5_filename)
+    if rewrite:
+        pose_store._block_columns = None
+    pose_store.apply_edit(10, 20, pose_store.individual_indices('animal1'), 5.0)
+    pose_store.flush()
+
+    h5 = pd.read_hdf(h5_filename)
+    assert h5.columns.equals(columns)
+    edited = h5.loc[10:19, ('scorer', 'animal1', slice(None), ['x', 'y'])]
+    assert (edited.to_numpy() == 5.0).all()
+    unchanged = [column for column in columns if column[1] != 'animal1' or column[3] == 'likelihood']
+    np.testing.assert_array_equal(h5[unchanged].to_numpy(), pd.DataFrame(values, columns=columns)[unchanged])